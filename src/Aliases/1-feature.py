@@ -1,6 +1,5 @@
 import os
 import sys
-import importlib
 from pathlib import Path
 
 # Local imports
@@ -9,15 +8,21 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'feature'
+
+def dependencies():
+    return ['state']
+
 def heading():
     return "Git Feature"
 
 def description():
-    return "Create a new feature branch from the current branch with a random identifier. Note that it relies on dashes as a delimiter, so it can't be used if your branch names include dashes."
+    return "Create a new feature branch from the current branch with a random identifier, or the one in `GIT_FEATURE_SUFFIX` when it is set. Note that it relies on dashes as a delimiter, so it can't be used if your branch names include dashes."
 
 def command():
     cmd = r"""
-    git config --global alias.feature '!git state && git checkout -b feature-$(git branch --show-current)-$(openssl rand -hex 4) 2>&1'
+    git config --global alias.feature '!git state && git checkout -b feature-$(git branch --show-current)-${GIT_FEATURE_SUFFIX:-$(openssl rand -hex 4)} 2>&1'
     """
     return cmd.strip()
 
@@ -25,14 +30,8 @@ def example():
     """Get a console output example for the alias."""
     # Setup
     repo = RepositoryFixture('feature-test')
-    repo.setup_first_commit()
-    repo.setup_second_changes()
-    repo.stage_file_two()
-    repo.run(command())
-
-    # Add the hide alias dependency
-    module = importlib.import_module('src.Aliases.9-state')
-    repo.run(module.command())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_changes', 'stage_file_two')
+    repo.install(name())
 
     # Get the console output
     output = repo.run("git branch") + "\n"
@@ -47,20 +46,20 @@ def test():
 
     # Setup the repository
     repo = RepositoryFixture('feature-test')
-    repo.setup_first_commit()
-    repo.setup_second_changes()
-    repo.stage_file_two()
-    repo.run(command())
-
-    # Add the hide alias dependency
-    module = importlib.import_module('src.Aliases.9-state')
-    repo.run(module.command())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_changes', 'stage_file_two')
+    repo.install(name())
 
     # Create a feature branch
     output = repo.print("git feature")
     Verify(output).contains(" M file-1.txt")
     Verify(output).contains("M  file-2.txt")
+    Verify(output).contains("Switched to a new branch 'feature-dev-4d1fc795'")
+
+    # Without the fixed suffix, the identifier is random
+    repo.run('git checkout -q dev')
+    output = repo.print('env -u GIT_FEATURE_SUFFIX git feature')
     Verify(output).contains("Switched to a new branch 'feature-dev-")
+    Verify(output).lacks('4d1fc795')
 
     repo.teardown()
 
@@ -8,15 +8,48 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'refresh'
+
+def dependencies():
+    return []
+
 def heading():
     return "Git Refresh"
 
 def description():
-    return "This is intended to be used after the feature branch generated via the 'git feature' alias has been merged on the remote repository. This command will temporarily stash changes (if any), switch back to the original branch, pull the latest changes, delete any local branches prefixed with \"feature-\", and reapply the temporarily stashed changes."
+    return "This is intended to be used after the feature branch generated via the 'git feature' alias has been merged on the remote repository. This command will temporarily stash changes (if any), switch back to the original branch, pull the latest changes, delete the local branches prefixed with \"feature-\" that are merged into it, and reapply the temporarily stashed changes. Unmerged feature branches are kept."
 
 def command():
     cmd = r"""
-    git config --global alias.refresh '!branch=$(git branch --show-current); original_branch=$(echo $branch | cut -d"-" -f2); git stash && git checkout $original_branch && git pull && git branch | grep "feature-" | xargs git branch -D && git stash pop && git branch'
+    git config --global alias.refresh '!f() {
+        # feature-<original>-<suffix> goes back to <original>
+        branch=$(git branch --show-current)
+        original=$branch
+        case "$branch" in
+            feature-*-*) original=${branch#feature-}; original=${original%-*} ;;
+        esac
+
+        # Only stash when tracked files have changes
+        stashed=0
+        if [ -n "$(git status --porcelain --untracked-files=no)" ]; then
+            git stash || return 1
+            stashed=1
+        fi
+
+        git checkout "$original" && git pull || return 1
+
+        # Delete the merged feature branches in one batch
+        merged=$(git for-each-ref --merged=HEAD --format="%(refname:short)" "refs/heads/feature-*")
+        if [ -n "$merged" ]; then
+            git branch -d $merged
+        fi
+
+        if [ "$stashed" -eq 1 ]; then
+            git stash pop
+        fi
+        git branch
+    }; f'
     """
     return cmd.strip()
 
@@ -25,21 +58,23 @@ def example():
 
     # Setup the remote repository first
     remote = RepositoryFixture('refresh-remote')
-    remote.run(command())
     remote.setup_first_commit()
     remote_path = remote.path.absolute()
 
     # Create local repo and copy .git from remote
     local = RepositoryFixture('refresh-local')
+    local.install(name())
     local_path = local.path.absolute()
-    local.run(f'rm -rf "{local_path}/.git"')
-    local.run(f'cp -r "{remote_path}/.git" "{local_path}/.git"')
-    local.run('git reset --hard HEAD')
+    local.run_batch([
+        f'rm -rf "{local_path}/.git"',
+        f'cp -r "{remote_path}/.git" "{local_path}/.git"',
+        'git reset --hard HEAD',
 
-    # Setup remote tracking on the local repository
-    local.run(f'git remote add origin "{remote_path}"')
-    local.run('git fetch origin')
-    local.run("git branch --set-upstream-to=origin/dev dev")
+        # Setup remote tracking on the local repository
+        f'git remote add origin "{remote_path}"',
+        'git fetch origin',
+        'git branch --set-upstream-to=origin/dev dev',
+    ])
 
     # Create a feature branch on local and push it to remote
     local.run("git branch")
@@ -65,21 +100,23 @@ def test():
 
     # Setup the remote repository first
     remote = RepositoryFixture('refresh-remote')
-    remote.run(command())
     remote.setup_first_commit()
     remote_path = remote.path.absolute()
 
     # Create local repo and copy .git from remote
     local = RepositoryFixture('refresh-local')
+    local.install(name())
     local_path = local.path.absolute()
-    local.run(f'rm -rf "{local_path}/.git"')
-    local.run(f'cp -r "{remote_path}/.git" "{local_path}/.git"')
-    local.run('git reset --hard HEAD')
+    local.run_batch([
+        f'rm -rf "{local_path}/.git"',
+        f'cp -r "{remote_path}/.git" "{local_path}/.git"',
+        'git reset --hard HEAD',
 
-    # Setup remote tracking on the local repository
-    local.run(f'git remote add origin "{remote_path}"')
-    local.run('git fetch origin')
-    local.run("git branch --set-upstream-to=origin/dev dev")
+        # Setup remote tracking on the local repository
+        f'git remote add origin "{remote_path}"',
+        'git fetch origin',
+        'git branch --set-upstream-to=origin/dev dev',
+    ])
 
     # Create a feature branch on local and push it to remote
     local.print("git branch")
@@ -116,6 +153,18 @@ def test():
     Verify(output).contains("Dropped refs/stash@{0}")
     Verify(output).contains("* dev")
 
+    # An unmerged feature branch is kept, and a clean tree isn't stashed
+    local.run_batch([
+        'git checkout -- :/',
+        'git checkout -q -b feature-dev-4b1d2c3e dev',
+        'git commit -q --allow-empty -m "Unmerged change"',
+    ])
+    output = local.print("git refresh")
+    Verify(output).lacks("Saved working directory")
+    Verify(output).lacks("Deleted branch")
+    Verify(output).contains("feature-dev-4b1d2c3e")
+    Verify(output).contains("* dev")
+
     local.teardown()
     remote.teardown()
 
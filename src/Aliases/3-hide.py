@@ -1,6 +1,5 @@
 import os
 import sys
-import importlib
 from pathlib import Path
 
 # Local imports
@@ -9,56 +8,47 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'hide'
+
+def dependencies():
+    return ['hidden']
+
 def heading():
     return 'Git Hide'
 
 def description():
-    return 'Send unstaged changes to a stash named "hidden". You can add more uncommitted changes to the same stash if needed with the same command.'
+    return 'Set unstaged changes aside under the `refs/hidden` ref, away from the stash list. You can add more unstaged changes to the hidden changes if needed with the same command, which only writes the new changes and leaves the files already hidden alone.'
 
 def command():
     return r'''
-      git config --global alias.hide '!git unhide > /dev/null 2>&1 || true && git stash push --keep-index -m "hidden" > /dev/null && git hidden'
+      git config --global alias.hide '!f() { dir=$(git rev-parse --git-dir); patch="$dir/hide.patch"; index="$dir/hide.index"; status=0; git update-index -q --refresh; git diff-files -p --binary > "$patch"; if [ -s "$patch" ]; then if old=$(git rev-parse -q --verify refs/hidden); then GIT_INDEX_FILE="$index" git read-tree "$old" && GIT_INDEX_FILE="$index" git apply --cached --3way "$patch" 2> /dev/null && tree=$(GIT_INDEX_FILE="$index" git write-tree) && new=$(git log -1 --format=%B "$old" | git commit-tree "$tree" -p "$old^1" -p "$old^2"); else new=$(git stash create hidden); fi && git apply -R "$patch" && { git update-ref -m hide refs/hidden "$new" $old || { git apply "$patch"; false; }; } || { echo "The new changes conflict with the hidden changes, they stay in the working tree." >&2; status=1; }; fi; rm -f "$patch" "$index"; git hidden; return $status; }; f'
     '''.strip()
 
 def example():
     """Get a console output example for the alias."""
     # Setup the repository
     repo = RepositoryFixture('hide-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-    repo.stage_file_two()
-
-    # Make sure the hidden alias is available
-    module = importlib.import_module('src.Aliases.4-hidden')
-    repo.run(module.command())
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_two')
 
-    # Make sure the unhide alias is available
-    module = importlib.import_module('src.Aliases.5-unhide')
-    repo.run(module.command())
-
-    # Make sure the state alias is available
-    module = importlib.import_module('src.Aliases.9-state')
-    repo.run(module.command())
+    # Make sure the unhide and state aliases are available
+    repo.install('unhide', 'state')
 
     # Get the console output
     output = repo.run("git state") + "\n"
     output += repo.run("git hide") + "\n"
-    output += repo.run("git stash list") + "\n"
 
-    # Add more changes
-    repo.setup_second_changes()
-    repo.stage_file_two()
+    # Add more changes to a file that isn't hidden yet
+    repo.write_file('file-2.txt', 'Second revision for file two.\n')
 
-    # Demonstrate stashing more changes
-    # output += repo.run("git state") + "\n"
+    # Demonstrate hiding more changes
     output += repo.run('git state') + "\n"
     output += repo.run("git hide") + "\n"
-    output += repo.run("git stash list") + "\n"
 
     # Demonstrate unhiding the changes
     output += repo.run("git unhide") + "\n"
-    output += repo.run("git stash list")
+    output += repo.run("git state")
 
     repo.teardown()
     return repo.clean(output)
@@ -68,21 +58,11 @@ def test():
 
     # Setup
     repo = RepositoryFixture('hide-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-
-    # Make sure the hidden alias is available
-    module = importlib.import_module('src.Aliases.4-hidden')
-    repo.run(module.command())
-
-    # Make sure the unhide alias is available
-    module = importlib.import_module('src.Aliases.5-unhide')
-    repo.run(module.command())
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_two')
 
     # Make sure the state alias is available
-    module = importlib.import_module('src.Aliases.9-state')
-    repo.run(module.command())
+    repo.install('state')
 
     repo.print("git state")
 
@@ -92,17 +72,70 @@ def test():
     output = repo.print('cat file-2.txt')
     Verify(output).contains('First revision for file two.')
 
-    # Hide the changes
+    # Hide the unstaged changes
     output = repo.print("git hide")
     Verify(output).contains(['Hidden: ', 'file-1.txt'])
-    Verify(output).contains(['Hidden: ', 'file-2.txt'])
+    Verify(output).lacks('file-2.txt')
 
     output = repo.print('cat file-1.txt')
     Verify(output).contains('Initial change for file one.')
 
-    # Check if the stash is created
+    # Check if the changes are kept under their own ref rather than in the stash list
+    output = repo.print("git log -1 --format=%s refs/hidden")
+    Verify(output).contains('On dev: hidden')
+
     output = repo.print("git stash list")
-    Verify(output).contains('stash@{0}: On dev: hidden')
+    Verify(output).lacks('hidden')
+
+    # Hide more changes without touching the files already hidden
+    hidden_file = Path(repo.path, 'file-1.txt')
+    modified = hidden_file.stat().st_mtime_ns
+    repo.write_file('file-2.txt', 'Second revision for file two.\n')
+
+    output = repo.print("git hide")
+    Verify(output).contains(['Hidden: ', 'file-1.txt'])
+    Verify(output).contains(['Hidden: ', 'file-2.txt'])
+    if hidden_file.stat().st_mtime_ns != modified:
+        raise AssertionError('The second hide rewrote a file that was already hidden.')
+
+    output = repo.print('git show refs/hidden:file-2.txt')
+    Verify(output).contains('Second revision for file two.')
+
+    output = repo.print('cat file-2.txt')
+    Verify(output).contains('First revision for file two.')
+
+    # A new change that conflicts with a hidden one stays in the working tree
+    repo.write_file('file-1.txt', 'Conflicting change for file one.\n')
+    result, = repo.run_batch(['git hide'], check=False)
+    if result.returncode != 1:
+        raise AssertionError(f'A conflicting hide exited with {result.returncode}.')
+    Verify(result.stderr).contains('they stay in the working tree')
+
+    output = repo.print('cat file-1.txt')
+    Verify(output).contains('Conflicting change for file one.')
+
+    output = repo.print('git show refs/hidden:file-1.txt')
+    Verify(output).contains('First revision for file one.')
+
+    # Diff settings meant for people don't change the patch, both for a first and a later hide
+    repo.run_batch([
+        'git checkout -q -- . && git update-ref -d refs/hidden',
+        'git config diff.noprefix true && git config color.ui always && git config diff.mnemonicPrefix true',
+        'printf "Configured change for file one.\\n" > file-1.txt',
+    ])
+    first, changed, second, unchanged = repo.run_batch([
+        'git hide',
+        'git diff --quiet && printf "Second configured change.\\n" > file-2.txt',
+        'git hide',
+        'git diff --quiet',
+    ], check=False)
+    for result in (first, changed, second, unchanged):
+        if result.returncode != 0:
+            raise AssertionError(f'"{result.args}" exited with {result.returncode}.\n{result.stderr}')
+
+    output = repo.print('git show refs/hidden:file-1.txt refs/hidden:file-2.txt')
+    Verify(output).contains('Configured change for file one.')
+    Verify(output).contains('Second configured change.')
 
     repo.teardown()
 
@@ -1,6 +1,5 @@
 import os
 import sys
-import importlib
 from pathlib import Path
 
 # Local imports
@@ -9,15 +8,21 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'hidden'
+
+def dependencies():
+    return []
+
 def heading():
     return 'Git Hidden'
 
 def description():
-    return 'List the file names for changes stored in a stash named "hidden".'
+    return 'List the file names for changes hidden with `git hide`.'
 
 def command():
     cmd = r"""
-    git config --global alias.hidden '!git stash list | grep ": hidden" | head -n1 | cut -d: -f1 | xargs -I {} git show --pretty="" --name-only {} | while read file; do echo "  Hidden: \033[31m$file\033[0m"; done'
+    git config --global alias.hidden '!git diff-tree -r --name-only --no-renames refs/hidden^2 refs/hidden 2> /dev/null | while read -r file; do printf "  Hidden: \033[31m%s\033[0m\n" "$file"; done'
     """
     return cmd.strip()
 
@@ -25,13 +30,12 @@ def example():
     """Get a console output example for the alias."""
     # Setup the repository
     repo = RepositoryFixture('hidden-test')
-    repo.setup_first_commit()
+    repo.setup_snapshot('setup_first_commit')
     # repo.setup_second_commit()
-    repo.run(command())
+    repo.install(name())
 
-    # Add the hide alias dependency
-    module = importlib.import_module('src.Aliases.3-hide')
-    repo.run(module.command())
+    # Make sure the hide, unhide and state aliases are available
+    repo.install('hide', 'unhide', 'state')
 
     # Create some changes and stash them
     repo.write_file('file-1.txt', 'Unstaged change for file one.\n')
@@ -43,7 +47,6 @@ def example():
     output += repo.run("git state") + '\n'
     output += repo.run("git hide") + '\n'
     output += repo.run("git state") + '\n'
-    output += repo.run("git stash list") + '\n'
     output += repo.run("git hidden")
 
     repo.teardown()
@@ -54,22 +57,27 @@ def test():
 
     # Setup
     repo = RepositoryFixture('hidden-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-    repo.run('git stash push --keep-index -m "hidden"')
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes')
+
+    # Make sure the hide and unhide aliases are available
+    repo.install('hide', 'unhide')
+
+    # Nothing is hidden yet
+    result, = repo.run_batch(["git hidden"])
+    if result.stdout != '':
+        raise AssertionError(f'git hidden listed {result.stdout!r} before anything was hidden.')
 
-    # Add the hide alias dependency
-    module = importlib.import_module('src.Aliases.3-hide')
-    repo.run(module.command())
+    repo.run('git hide')
 
     # Run the hidden alias
-    output = repo.print("git hidden")
-    Verify(output).contains('Hidden: file-1.txt')
-    Verify(output).contains('Hidden: file-2.txt')
+    result, = repo.run_batch(["git hidden"])
+    print(f'$ git hidden\n{result.stdout}')
+    if repo.clean(result.stdout) != 'Hidden: file-1.txt\n  Hidden: file-2.txt':
+        raise AssertionError(f'git hidden listed {result.stdout!r} instead of the two hidden files.')
 
     output = repo.print("git stash list")
-    Verify(output).contains('hidden')
+    Verify(output).lacks('hidden')
 
     repo.teardown()
 
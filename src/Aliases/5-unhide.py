@@ -1,6 +1,5 @@
 import os
 import sys
-import importlib
 from pathlib import Path
 
 # Local imports
@@ -9,16 +8,22 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'unhide'
+
+def dependencies():
+    return []
+
 def heading():
     return 'Git Unhide'
 
 def description():
-    return '''Restore the hidden changes from the stash named "hidden".
-*Not currently working when there is a conflict.*'''
+    return '''Restore the changes hidden with `git hide` to the working tree.
+*When the hidden changes conflict with the working tree, they stay hidden.*'''
 
 def command():
     cmd = r"""
-    git config --global alias.unhide '!f() { files=$(git hidden | sed "s/  Hidden:/  Unhidden:/g" | sed "s/\x1b\[31m/\x1b\[32m/g"); git stash list | grep "hidden" | head -n1 | cut -d: -f1 | xargs -I {} git stash pop {} > /dev/null 2>&1; echo "$files"; }; f'
+    git config --global alias.unhide '!f() { files=$(git diff-tree -r --name-only --no-renames refs/hidden^2 refs/hidden 2> /dev/null) || return 0; if [ -n "$files" ]; then git diff-tree -p --binary --no-renames refs/hidden^2 refs/hidden | git apply 2> /dev/null || { echo "The hidden changes conflict with the working tree, they stay hidden." >&2; return 1; }; fi; git update-ref -d refs/hidden; [ -z "$files" ] || printf "%s\n" "$files" | while read -r file; do printf "  Unhidden: \033[32m%s\033[0m\n" "$file"; done; }; f'
     """
     return cmd.strip()
 
@@ -27,25 +32,17 @@ def example():
 
     # Setup
     repo = RepositoryFixture('unhide-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-    repo.stage_file_two()
-
-    # Make sure the hide alias is available
-    module = importlib.import_module('src.Aliases.3-hide')
-    repo.run(module.command())
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_two')
 
-    # Make sure the hidden alias is available
-    module = importlib.import_module('src.Aliases.4-hidden')
-    repo.run(module.command())
+    # Make sure the hide, hidden and state aliases are available
+    repo.install('hide', 'hidden', 'state')
 
     # Additional setup
 
     # Hide the changes
     output = repo.run("git state") + '\n'
     output += repo.run("git hide") + '\n'
-    output += repo.run("git stash list") + '\n'
     output += repo.run("git state") + '\n'
     output += repo.run("git unhide") + '\n'
     output += repo.run("git state")
@@ -58,18 +55,11 @@ def test():
 
     # Setup
     repo = RepositoryFixture('unhide-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-    repo.stage_file_two()
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_two')
 
-    # Make sure the hide alias is available
-    module = importlib.import_module('src.Aliases.3-hide')
-    repo.run(module.command())
-
-    # Make sure the hidden alias is available
-    module = importlib.import_module('src.Aliases.4-hidden')
-    repo.run(module.command())
+    # Make sure the hide, hidden and state aliases are available
+    repo.install('hide', 'hidden', 'state')
 
     repo.print("git stash list")
     repo.print("git state")
@@ -82,7 +72,24 @@ def test():
     output = repo.print("git unhide")
     Verify(output).contains(['Unhidden:', 'file-1.txt'])
 
-    repo.print("git stash list")
+    output = repo.print('cat file-1.txt')
+    Verify(output).contains('First revision for file one.')
+
+    # The ref is gone, so a second unhide has nothing to restore
+    output = repo.print("git unhide")
+    Verify(output).lacks('Unhidden:')
+
+    # Conflicting hidden changes stay hidden
+    repo.run("git hide")
+    repo.write_file('file-1.txt', 'Conflicting change for file one.\n')
+    result, hidden = repo.run_batch(['git unhide', 'git rev-parse -q --verify refs/hidden'], check=False)
+    if result.returncode != 1 or hidden.returncode != 0:
+        raise AssertionError(f'A conflicting unhide exited with {result.returncode}, and the ref check with {hidden.returncode}.')
+    Verify(result.stderr).contains('they stay hidden')
+
+    output = repo.print("git hidden")
+    Verify(output).contains(['Hidden: ', 'file-1.txt'])
+
     repo.print("git state")
 
     repo.teardown()
@@ -8,42 +8,78 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'pluck'
+
+def dependencies():
+    return []
+
 def heading():
     return 'Git Pluck'
 
 def description():
-    return 'Pop a specific stash by index and display the remaining stashes. Without an index argument, it will list the available stashes.'
+    return 'Pop a specific stash by index, or by a part of its message, and display the remaining stashes. Without an argument, it will list the available stashes.'
 
 def command():
     cmd = r"""
     git config --global alias.pluck '!f() {
+        # Read the stash list once, everything below is formatted from it
+        stashes=$(git stash list)
+
         if [ -z "$1" ]; then
-            if [ -n "$(git stash list)" ]; then
-                echo "Available stashes:"
-                git stash list
-                echo ""
+            if [ -n "$stashes" ]; then
+                printf "Available stashes:\n%s\n\n" "$stashes"
             fi
 
-            printf "Usage: git pluck <index>"
-        else
-            STASH_INFO=$(git stash list | grep "stash@{$1}")
+            echo "Usage: git pluck <index|message>"
+            return
+        fi
 
-            if [ -n "$STASH_INFO" ]; then
-                echo "Plucking: $STASH_INFO"
-            fi
+        # Look the stash up by index, or else by the first message containing the argument
+        match=$(printf "%s\n" "$stashes" | awk -v key="$1" "
+            {
+                position = NR - 1
+                message = substr(\$0, index(\$0, \": \") + 2)
+                if (key ~ /^[0-9]+\$/ ? key == position : index(message, key)) {
+                    print position \":\" \$0
+                    exit
+                }
+            }
+        ")
+
+        if [ -z "$match" ]; then
+            echo "No stash matches: $1" >&2
+            return 1
+        fi
 
-            (git stash pop stash@{$1} 2>&1 |
-                grep -A99 "error:" |
-                grep -B99 "merge." |
-                sed "s/error:/\nerror:/" |
-                sed "s/Please/\nPlease/") || true
+        position=${match%%:*}
+        echo "Plucking: ${match#*:}"
 
-            if [ -n "$(git stash list)" ]; then
-                printf "\nRemaining stashes:"
-                printf "\n$(git stash list)"
-            fi
+        # Keep only the error and its advice from the pop output
+        if errors=$(git stash pop "stash@{$position}" 2>&1); then
+            dropped=$position
+        else
+            dropped=-1
+            printf "%s\n" "$errors" | awk "
+                /^error:/ { show = 1; print \"\" }
+                /^Please/ { print \"\" }
+                show { print }
+                /merge\\./ { exit }
+            "
+        fi
+
+        # Renumber the stashes that came after the popped one
+        remaining=$(printf "%s\n" "$stashes" | awk -v dropped="$dropped" "
+            NR - 1 != dropped {
+                position = NR - 1 - (dropped >= 0 && NR - 1 > dropped)
+                sub(/^stash@\\{[0-9]+\\}/, \"stash@{\" position \"}\")
+                print
+            }
+        ")
+
+        if [ -n "$remaining" ]; then
+            printf "\nRemaining stashes:\n%s\n" "$remaining"
         fi
-        echo ""
     }; f'
     """
     return cmd.strip()
@@ -52,13 +88,10 @@ def example():
     """Get a console output example for the alias."""
     # Setup
     repo = RepositoryFixture('pluck-test')
-    repo.run(command())
+    repo.install(name())
 
     # Create stashes for testing
-    repo.setup_initial_commit()
-    repo.setup_first_stash()
-    repo.setup_second_stash()
-    repo.setup_third_stash()
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_stash', 'setup_second_stash', 'setup_third_stash')
 
     # Get the console output
     output = repo.run("git pluck") + '\n'
@@ -73,18 +106,15 @@ def test():
 
     # Setup
     repo = RepositoryFixture('pluck-test')
-    repo.run(command())
+    repo.install(name())
 
     # Test the alias without stashes and without an index argument
     output = repo.print('git pluck')
     Verify(output).lacks('Available stashes:')
-    Verify(output).contains('Usage: git pluck <index>')
+    Verify(output).contains('Usage: git pluck <index|message>')
 
     # create some stashes
-    repo.setup_initial_commit()
-    repo.setup_first_stash()
-    repo.setup_second_stash()
-    repo.setup_third_stash()
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_stash', 'setup_second_stash', 'setup_third_stash')
 
     # Test the alias with stashes and without an index argument
     output = repo.print("git pluck")
@@ -117,6 +147,20 @@ def test():
     Verify(output).contains('stash@{0}: On dev: Third Stash')
     Verify(output).contains('stash@{1}: On dev: Second Stash')
 
+    # Pluck a stash by a part of its message
+    repo.run('git checkout -q -- :/')
+    output = repo.print("git pluck Second")
+    Verify(output).contains('Plucking: stash@{1}: On dev: Second Stash')
+    Verify(output).contains('stash@{0}: On dev: Third Stash')
+    Verify(output.split('Remaining stashes:')[1]).lacks('Second Stash')
+
+    output = repo.print('cat file-1.txt')
+    Verify(output).contains('Second revision for file one.')
+
+    # An unknown stash is reported instead of popped
+    result, = repo.run_batch(['git pluck Missing'], check=False)
+    Verify(result.stderr).contains('No stash matches: Missing')
+
     repo.teardown()
 
 if __name__ == '__main__':
@@ -1,5 +1,11 @@
 import os
+import re
+import pty
 import sys
+import fcntl
+import struct
+import termios
+import subprocess
 from pathlib import Path
 
 # Local imports
@@ -8,19 +14,25 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'last'
+
+def dependencies():
+    return []
+
 def heading():
     return 'Git Last'
 
 def description():
     return '''View recent commits in a clean, terminal-width-aware format.
-    - Shows the last 20 commits
+    - Shows the last 20 commits, or the given number of commits (`git last 500`)
     - Truncates to avoid wrapping based on terminal width
-    - Adds ellipsis for truncated lines
+    - Marks truncated lines with `..`, and pads the others with spaces up to the same width
     '''.strip()
 
 def command():
     return r'''
-      git config --global alias.last '!cols=$(tput cols); color_padding=11; git log -n 20 --oneline --color=always | while read -r line; do if [ ${#line} -gt $((cols-3)) ]; then echo "${line:0:$((cols+color_padding-6))}..."; else echo "$line"; fi; done'
+      git config --global alias.last '!f() { git --no-pager log -n "${1:-20}" --color=always --format="%C(auto)%h %<|(-1,trunc)%s"; }; f'
     '''.strip()
 
 def example():
@@ -28,13 +40,12 @@ def example():
 
     # Setup
     repo = RepositoryFixture('last-test')
-    repo.run(command())
-    repo.setup_first_commit()
-    repo.setup_second_commit()
+    repo.install(name())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_commit')
     message = 'Third committed change. Truncated to fit the terminal width...'
     repo.setup_third_commit(message)
 
-    # Get the console output
+    # Get the console output, padding included
     output = repo.run('git last')
 
     repo.teardown()
@@ -44,9 +55,8 @@ def test():
     """Test the Git last alias."""
     # Setup the repository
     repo = RepositoryFixture('last-test')
-    repo.run(command())
-    repo.setup_first_commit()
-    repo.setup_second_commit()
+    repo.install(name())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_commit')
     message = 'Third committed change. This commit message is intentionally ' \
       'long to verify that messages exceeding the terminal width are truncated ' \
       'and that the output remains on a single line without wrapping.'
@@ -54,11 +64,40 @@ def test():
 
     # Test the alias
     output = repo.print('git last')
-    Verify(output).contains('...') # Message is truncated to fit terminal width
+    Verify(output).contains('..') # Message is truncated to fit terminal width
     Verify(output).contains('Third committed change')
     Verify(output).contains('Second committed change')
     Verify(output).contains('First committed change')
 
+    # Every line fits in the terminal width
+    columns = int(repo.env['COLUMNS'])
+    for line in repo.clean(output).splitlines():
+        if len(line) >= columns:
+            raise AssertionError(f'The line `{line}` does not fit in {columns} columns.\n')
+
+    # Without COLUMNS, git reads the width of the terminal it writes to
+    master, terminal = pty.openpty()
+    fcntl.ioctl(terminal, termios.TIOCSWINSZ, struct.pack('HHHH', 24, 150, 0, 0))
+    env = {key: value for key, value in repo.env.items() if key != 'COLUMNS'}
+    subprocess.run('git last', shell=True, cwd=repo.path, env=env, stdout=terminal, stderr=terminal, check=True)
+    os.close(terminal)
+    output = b''
+    try:
+        while chunk := os.read(master, 4096):
+            output += chunk
+    except OSError:
+        pass # The terminal side is closed once everything is read
+    os.close(master)
+    widths = [len(re.sub(r'\x1b\[[0-9;]*m', '', line)) for line in output.decode().splitlines()] # Padding included
+    if widths != [149, 149, 149]:
+        raise AssertionError(f'git last wrote lines of {widths} characters to a terminal of 150 columns.')
+
+    # Limit the number of commits
+    output = repo.print('git last 2')
+    Verify(output).contains('Third committed change')
+    Verify(output).contains('Second committed change')
+    Verify(output).lacks('First committed change')
+
     repo.teardown()
 
 if __name__ == '__main__':
@@ -8,6 +8,12 @@ from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'uncommit'
+
+def dependencies():
+    return []
+
 def command():
     cmd = r"""
     git config --global alias.uncommit '!git log -1 --oneline --color=always | sed "s/^/Uncommitted: /" && git reset --soft HEAD~1'
@@ -25,10 +31,8 @@ def example():
 
     # Setup the repository and commits and alias
     repo = RepositoryFixture('uncommit-test')
-    repo.run(command())
-    repo.setup_first_commit()
-    repo.setup_second_commit()
-    repo.setup_third_commit()
+    repo.install(name())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_commit', 'setup_third_commit')
 
     # Get the console output
     output = repo.run("git log --oneline") + "\n"
@@ -42,10 +46,11 @@ def test():
 
     # Setup
     repo = RepositoryFixture('uncommit-test')
-    repo.run(command())
-    repo.setup_first_commit()
-    repo.setup_second_commit()
-    repo.setup_third_commit()
+    repo.install(name())
+    repo.setup_snapshot('setup_first_commit', 'setup_second_commit', 'setup_third_commit')
+
+    # Make sure the state alias is available
+    repo.install('state')
 
     # Verify that there are two commits
     output = repo.print("git log --oneline")
@@ -1,143 +1,367 @@
 import os
 import sys
+import time
 from pathlib import Path
 
 # Local imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from src.Lib.fixture import RepositoryFixture
 from src.Lib.verifier import Verify
+from src.Lib.profiler import count_processes
+
+def name():
+    return 'state'
+
+def dependencies():
+    return []
 
 def heading():
     return 'Git State'
 
 def description():
-    return 'Show the current state of the working directory and staging area.'
+    return 'Show the current state of the working directory and staging area. In large repositories, `--no-renames` skips rename detection and `--untracked-files=<mode>` (`no`, `normal` or `all`) limits the search for untracked files. For a shell prompt, `--summary` prints only the branch and a count per category, like `dev S:3 U:12 C:0 ?:4`. If the status takes longer than `--timeout=<ms>` (200 by default, 0 to always wait without keeping the summary), it prints the last summary marked `(stale)` and finishes updating it in the background. For very large change sets, `--stream[=<lines>]` prints the branch at once, prints each section as soon as it is complete, and lists only the first lines of each section (20 by default) followed by a count of the rest. `--all [<dir>]` prints the summary of every repository under a directory (the current one by default), grouped by their most pressing category, collecting up to `--jobs=<n>` (8 by default) at once. `--recursive` also lists the changes inside submodules, with their paths in the superproject, collecting the submodules the same way.'
 
 def command():
     return r'''
     git config --global alias.state '!f() {
-      lf="
-"
-      get_properties() {
-        case "$1" in
-          "##") echo "Heading|" ;;
-          " M") echo "Unstaged|modified file" ;;
-          " D") echo "Unstaged|deleted file" ;;
-          "??") echo "Unstaged|untracked file" ;;
-          "MM") echo "Mixed|staged modifications plus unstaged modifications" ;;
-          "AM") echo "Mixed|staged new file plus unstaged modifications" ;;
-          "MD") echo "Mixed|staged modifications plus unstaged deletion" ;;
-          "AD") echo "Mixed|staged new file plus unstaged deletion" ;;
-          "RD") echo "Mixed|staged rename plus unstaged deletion" ;;
-          "RM") echo "Mixed|staged rename plus unstaged modifications" ;;
-          "CM") echo "Mixed|staged copy plus unstaged modifications" ;;
-          "CD") echo "Mixed|staged copy plus unstaged deletion" ;;
-          "A ") echo "Staged|added new file" ;;
-          "M ") echo "Staged|modified file" ;;
-          "D ") echo "Staged|deleted file" ;;
-          "R ") echo "Staged|renamed file" ;;
-          "C ") echo "Staged|copied file" ;;
-          "UU") echo "Conflicted|both modified" ;;
-          "DD") echo "Conflicted|both deleted" ;;
-          "AA") echo "Conflicted|both added" ;;
-          "AU") echo "Conflicted|our new file conflicts with their path" ;;
-          "UA") echo "Conflicted|their new file conflicts with our path" ;;
-          "DU") echo "Conflicted|deleted by us, modified by them" ;;
-          "UD") echo "Conflicted|modified by us, deleted by them" ;;
-          *) echo "Uncategorized|unrecognized status code" ;;
+      untracked="--untracked-files=all"
+      renames=""
+      stream=0
+      summary=0
+      timeout=200
+      locks=""
+      submodules=""
+      recursive=0
+      all=0
+      root=""
+      jobs=8
+      usage="usage: git state [--no-renames] [--untracked-files=<mode>] [--stream[=<lines>]] [--summary [--timeout=<ms>]] [--recursive [--jobs=<n>]] [--all [--jobs=<n>] [<dir>]]"
+
+      for arg in "$@"; do
+        case "$arg" in
+          --no-renames) renames="--no-renames" ;;
+          -u*|--untracked-files*) untracked="$arg" ;;
+          --stream) stream=20 ;;
+          --stream=*) stream="${arg#--stream=}" ;;
+          --summary) summary=1; locks="--no-optional-locks" ;;
+          --timeout=*) timeout="${arg#--timeout=}" ;;
+          --recursive) recursive=1; submodules="--ignore-submodules=dirty" ;;
+          --all) all=1 ;;
+          --jobs=*) jobs="${arg#--jobs=}" ;;
+          -*) echo "$usage" >&2; return 1 ;;
+          *) if [ -n "$root" ]; then echo "$usage" >&2; return 1; fi; root="$arg" ;;
         esac
-      }
+      done
 
-      yellow() {
-        local BOLD_YELLOW="\033[1;33m"
-        local NO_COLOR="\033[0m"
-        printf "${BOLD_YELLOW}$1${NO_COLOR}"
-      }
+      if [ -n "$root" ] && [ "$all" = 0 ]; then
+        echo "$usage" >&2
+        return 1
+      fi
 
-      status_lines=$(git status --short --branch --untracked-files=all)
-      max_length=$(echo "$status_lines" | wc -L)
-
-      heading_lines=""
-      unstaged_lines=""
-      conflict_lines=""
-      staged_lines=""
-      uncategorized_lines=""
-
-      IFS="$lf" read -r -d "" -a status_lines <<< "$status_lines"
-
-      for line in "${status_lines[@]}"; do
-        code=${line:0:2}
-        rest=${line:2}
-        properties=$(get_properties "$code")
-        category=$(echo "$properties" | cut -d"|"  -f1)
-        padding=$(printf "%*s    " $((max_length - ${#line})) "")
-        description=$(yellow "$(echo "$properties" | cut -d"|" -f2)")
-
-        if [ "$category" == "Heading" ]; then
-          heading_lines+="$(yellow "Branch:")${rest}${lf}"
-        fi
-
-        if [ "$category" == "Unstaged" ]; then
-          unstaged_lines+="$(yellow "${code}")${rest}${padding}${description}${lf}"
-        fi
-
-        if [ "$category" == "Mixed" ]; then
-          # keep second character, replace first with space
-          unstaged_code=" ${code:1}"
-          unstaged_properties=$(get_properties "$unstaged_code")
-          unstaged_description=$(yellow "$(echo "$unstaged_properties" | cut -d"|" -f2)")
-          unstaged_lines+="$(yellow "${unstaged_code}")${rest}${padding}${unstaged_description}${lf}"
-
-          # keep first character, replace second with space
-          staged_code="${code:0:1}"
-          staged_properties=$(get_properties "$staged_code")
-          staged_description=$(yellow "$(echo "$staged_properties" | cut -d"|" -f2)")
-          staged_lines+="$(yellow "${staged_code} ")${rest}${padding}${staged_description}${lf}"
-        fi
-
-        if [ "$category" == "Staged" ]; then
-          staged_lines+="$(yellow "${code}")${rest}${padding}${description}${lf}"
-        fi
-
-        if [ "$category" == "Conflicted" ]; then
-          conflict_lines+="$(yellow "${code}")${rest}${padding}${description}${lf}"
-        fi
-
-        if [ "$category" == "Uncategorized" ]; then
-          uncategorized_lines+="$(yellow "${code}")${rest}${padding}${description}${lf}"
-        fi
+      for number in "$stream" "$timeout" "$jobs"; do
+        case "$number" in
+          ""|*[!0-9]*) echo "$usage" >&2; return 1 ;;
+        esac
       done
 
-      output=""
-
-      if [ "$heading_lines" ]; then
-        output+="${heading_lines}"
+      # Show a running count while streaming to a terminal
+      progress=0
+      if [ "$stream" -gt 0 ] && [ -t 2 ]; then
+        progress=1
       fi
 
-      if [ "$conflict_lines" ]; then
-        output+="${lf}$(yellow "Conflicts:")"
-        output+="${lf}${conflict_lines}"
-      fi
+      categories="
+ M|Unstaged|modified file
+ D|Unstaged|deleted file
+??|Unstaged|untracked file
+MM|Mixed|staged modifications plus unstaged modifications
+AM|Mixed|staged new file plus unstaged modifications
+MD|Mixed|staged modifications plus unstaged deletion
+AD|Mixed|staged new file plus unstaged deletion
+RD|Mixed|staged rename plus unstaged deletion
+RM|Mixed|staged rename plus unstaged modifications
+CM|Mixed|staged copy plus unstaged modifications
+CD|Mixed|staged copy plus unstaged deletion
+A |Staged|added new file
+M |Staged|modified file
+D |Staged|deleted file
+R |Staged|renamed file
+C |Staged|copied file
+UU|Conflicted|both modified
+DD|Conflicted|both deleted
+AA|Conflicted|both added
+AU|Conflicted|our new file conflicts with their path
+UA|Conflicted|their new file conflicts with our path
+DU|Conflicted|deleted by us, modified by them
+UD|Conflicted|modified by us, deleted by them
+"
 
-      if [ "$unstaged_lines" ]; then
-        output+="${lf}$(yellow "Unstaged:")"
-        output+="${lf}${unstaged_lines}"
-      fi
+      # Paths are NUL-terminated and unquoted, so they are never split on spaces
+      # With --recursive, the submodule statuses are collected while the superproject one runs,
+      # and follow it as a "# submodule <path>" record and the entries of that submodule.
+      # Each status leaves out the contents of its submodules, which are listed on their own
+      list_submodules() {
+        git -C "${1:-.}" config -z -f .gitmodules --get-regexp "^submodule[.].*[.]path\$" 2> /dev/null | tr "\0" "\n" | while read -r key && read -r path; do
+          path="${1:+$1/}$path"
+          if [ -e "$path/.git" ]; then
+            printf "%s\0" "$path"
+            list_submodules "$path"
+          fi
+        done
+      }
+
+      render() {
+        {
+          if [ "$recursive" = 1 ]; then
+            modules=$(mktemp -d) || return 1
+            list_submodules | xargs -0 -n 1 -P "$jobs" sh -c "
+              [ -n \"\$1\" ] || exit 0
+              output=\"\$0/\$(printf %s \"\$1\" | tr / %)\"
+              printf \"# submodule %s\\0\" \"\$1\" > \"\$output\"
+              git -C \"\$1\" $locks status --porcelain=v2 -z $untracked $renames $submodules >> \"\$output\"
+            " "$modules" &
+          fi
+
+          git $locks status --porcelain=v2 -z --branch $untracked $renames $submodules
+
+          if [ "$recursive" = 1 ]; then
+            wait
+            cat "$modules"/* 2> /dev/null
+            rm -rf "$modules"
+          fi
+        } | awk -v categories="$categories" -v limit="$stream" -v progress="$progress" -v summary="$summary" -v recursive="$recursive" "
+          function yellow(text) {
+            return \"\033[1;33m\" text \"\033[0m\"
+          }
+
+          function describe(code) {
+            return yellow((code in description) ? description[code] : \"unrecognized status code\")
+          }
+
+          # Entries are kept per section, only up to the preview limit when streaming
+          function add(section, code, text) {
+            total[section]++
+            if (summary || (limit && total[section] > limit)) return
+            kept[section]++
+            codes[section, kept[section]] = code
+            texts[section, kept[section]] = text
+            if (length(text) + 2 > width[section]) width[section] = length(text) + 2
+            if (width[section] > width[\"all\"]) width[\"all\"] = width[section]
+          }
+
+          function classify(code, text,    type) {
+            text = \" \" text
+            type = (code in category) ? category[code] : \"Uncategorized\"
+            if (code == \"??\") untracked++
+            if (type == \"Mixed\") {
+              add(\"Unstaged\", \" \" substr(code, 2, 1), text)
+              add(\"Staged\", substr(code, 1, 1) \" \", text)
+            } else {
+              add(type, code, text)
+            }
+
+            if (progress && ++classified % 1000 == 0) {
+              printf \"\rClassified %d entries\", classified > \"/dev/stderr\"
+              fflush(\"/dev/stderr\")
+            }
+          }
+
+          function heading(    branch) {
+            branch = head
+            if (initial) {
+              branch = \"No commits yet on \" head
+            } else if (head == \"(detached)\") {
+              branch = \"HEAD (no branch)\"
+            } else if (upstream != \"\") {
+              branch = branch \"...\" upstream
+              if (!tracking) branch = branch \" [gone]\"
+              else if (ahead && behind) branch = branch \" [ahead \" ahead \", behind \" behind \"]\"
+              else if (ahead) branch = branch \" [ahead \" ahead \"]\"
+              else if (behind) branch = branch \" [behind \" behind \"]\"
+            }
+            if (length(branch) + 3 > width[\"all\"]) width[\"all\"] = length(branch) + 3
+
+            printf \"%s\n\", yellow(\"Branch:\") \" \" branch
+            headed = 1
+          }
+
+          # Sections are padded to the widest line overall, or to their own widest line when streaming
+          function section(name, title,    i, padding) {
+            printed[name] = 1
+            if (!total[name]) return
+
+            padding = limit ? width[name] : width[\"all\"]
+            printf \"\n%s\n\", yellow(title)
+            for (i = 1; i <= kept[name]; i++) {
+              printf \"%s%s%\" (padding - length(texts[name, i]) + 2) \"s%s\n\", yellow(codes[name, i]), texts[name, i], \"\", describe(codes[name, i])
+            }
+            if (total[name] > kept[name]) {
+              printf \"%s\n\", yellow(\"... and \" (total[name] - kept[name]) \" more\")
+            }
+            fflush()
+          }
+
+          BEGIN {
+            RS = \"\0\" # Each entry of git status -z is a record, so paths may hold newlines
+            rows = split(categories, row, \"\n\")
+            for (i = 1; i <= rows; i++) {
+              if (row[i] == \"\") continue
+              key = substr(row[i], 1, 2)
+              split(substr(row[i], 4), fields, \"|\")
+              category[key] = fields[1]
+              description[key] = fields[2]
+            }
+          }
+
+          # The original path of a rename or copy follows its entry
+          origin {
+            classify(code, prefix \$0 \" -> \" path)
+            origin = 0
+            next
+          }
+
+          /^# branch[.]oid / { initial = (\$3 == \"(initial)\"); next }
+          /^# branch[.]head / { head = \$3; next }
+          /^# branch[.]upstream / { upstream = \$3; next }
+          /^# branch[.]ab / { ahead = substr(\$3, 2) + 0; behind = substr(\$4, 2) + 0; tracking = 1; next }
+          /^# submodule / { prefix = substr(\$0, 13) \"/\"; next }
+          /^#/ { next }
+
+          limit && !headed {
+            heading()
+            fflush()
+          }
+
+          # Untracked and ignored files come last, so the tracked sections are complete
+          \$1 == \"?\" || \$1 == \"!\" {
+            if (limit && !recursive && !printed[\"Staged\"]) {
+              section(\"Conflicted\", \"Conflicts:\")
+              section(\"Staged\", \"Staged:\")
+            }
+            classify(\$1 \$1, prefix substr(\$0, 3))
+            next
+          }
+
+          # Ordinary, renamed and unmerged entries have 8, 9 and 10 fields before the path
+          {
+            code = \$2
+            gsub(/[.]/, \" \", code)
+            path = \$0
+            skip = (\$1 == \"1\") ? 8 : (\$1 == \"2\") ? 9 : 10
+            for (i = 0; i < skip; i++) sub(/^[^ ]* /, \"\", path)
+            path = prefix path
+
+            if (\$1 == \"2\") {
+              origin = 1
+            } else {
+              classify(code, path)
+            }
+          }
+
+          END {
+            if (summary) {
+              if (head == \"\") exit 1 # The status failed before its branch line
+              printf \"%s S:%d U:%d C:%d ?:%d\", (head == \"(detached)\") ? \"HEAD\" : head, total[\"Staged\"], total[\"Unstaged\"] - untracked, total[\"Conflicted\"], untracked
+              if (total[\"Uncategorized\"]) printf \" X:%d\", total[\"Uncategorized\"]
+              printf \"\n\"
+              exit
+            }
+
+            if (progress && classified >= 1000) printf \"\r\033[K\" > \"/dev/stderr\"
+            if (!headed) heading()
+            if (!printed[\"Conflicted\"]) section(\"Conflicted\", \"Conflicts:\")
+            if (!printed[\"Unstaged\"]) section(\"Unstaged\", \"Unstaged:\")
+            if (!printed[\"Staged\"]) section(\"Staged\", \"Staged:\")
+            if (!printed[\"Uncategorized\"]) section(\"Uncategorized\", \"Uncategorized:\")
+          }
+        "
+      }
 
-      if [ "$staged_lines" ]; then
-        output+="${lf}$(yellow "Staged:")"
-        output+="${lf}${staged_lines}"
+      # Collect the summary of every repository under a directory, several at a time.
+      # The directory is relative to where git was run, and is listed when it is a repository.
+      # The search stops at each repository below it, so the first summaries start right away
+      if [ "$all" = 1 ]; then
+        cd "${GIT_PREFIX:-.}" || return 1
+        {
+          if [ -e "${root:-.}/.git" ]; then printf "%s\0" "${root:-.}"; fi
+          find "${root:-.}" -mindepth 1 -type d \( -name .git -prune -o -exec test -e {}/.git \; -prune -print0 \)
+        } | xargs -0 -n 1 -P "$jobs" sh -c "
+          [ -n \"\$1\" ] || exit 0
+          printf \"%s\t%s\n\" \"\$1\" \"\$(git -C \"\$1\" state --summary --timeout=0 2>&1)\"
+        " _ | sort | awk -F "\t" "
+          function yellow(text) {
+            return \"\033[1;33m\" text \"\033[0m\"
+          }
+
+          # Each repository is listed under its most pressing category
+          {
+            name = \$1
+            sub(/^[.]\\//, \"\", name)
+            delete count
+            fields = split(\$2, field, \" \")
+            for (i = 2; i <= fields; i++) {
+              if (split(field[i], pair, \":\") == 2) count[pair[1]] = pair[2] + 0
+            }
+
+            if (fields < 5) group = \"Uncategorized\"
+            else if (count[\"C\"]) group = \"Conflicted\"
+            else if (count[\"U\"] || count[\"?\"] || count[\"X\"]) group = \"Unstaged\"
+            else if (count[\"S\"]) group = \"Staged\"
+            else group = \"Clean\"
+
+            size[group]++
+            names[group, size[group]] = name
+            summaries[group, size[group]] = \$2
+            if (length(name) + 2 > width) width = length(name) + 2
+          }
+
+          function section(name, title,    i) {
+            if (!size[name]) return
+            printf \"\n%s\n\", yellow(title)
+            for (i = 1; i <= size[name]; i++) {
+              printf \" %s%\" (width - length(names[name, i])) \"s%s\n\", names[name, i], \"\", summaries[name, i]
+            }
+          }
+
+          END {
+            printf \"%s %d\n\", yellow(\"Repositories:\"), NR
+            section(\"Conflicted\", \"Conflicts:\")
+            section(\"Unstaged\", \"Unstaged:\")
+            section(\"Staged\", \"Staged:\")
+            section(\"Uncategorized\", \"Uncategorized:\")
+            section(\"Clean\", \"Clean:\")
+          }
+        "
+        return
       fi
 
-      if [ "$uncategorized_lines" ]; then
-        output+="${lf}$(yellow "Uncategorized:")"
-        output+="${lf}${uncategorized_lines}"
+      # Without a time budget there is nothing to fall back to, so no summary is kept
+      if [ "$summary" = 0 ] || [ "$timeout" = 0 ]; then
+        render
+        return
       fi
 
-      # Trim trailing whitespace
-      # echo "${output%"${output##*[![:space:]]}"}"
-      # printf "%s" "$output" | awk "{print \$0}"
-      printf "%s" "$output"
+      # Render the summary in the background, and fall back to the last one if it is late.
+      # The render and a single timer race to print a line, and the first line decides
+      cache="$(git rev-parse --git-dir)/state-summary" || return 1
+      seconds=$(printf "%d.%03d" $((timeout / 1000)) $((timeout % 1000)))
+      outcome=$({
+        (render > "$cache.$$" && [ -s "$cache.$$" ] && mv "$cache.$$" "$cache" && echo rendered || { rm -f "$cache.$$"; echo failed; }) 2> /dev/null &
+        (sleep "$seconds"; echo late) 2> /dev/null &
+      } | head -n 1)
+
+      if [ "$outcome" = rendered ]; then
+        IFS= read -r last < "$cache"
+        echo "$last"
+      elif [ -f "$cache" ]; then
+        IFS= read -r last < "$cache"
+        echo "$last (stale)"
+      elif [ "$outcome" = late ]; then
+        echo "(pending)"
+      else
+        echo "git state: the summary failed, run git state for details" >&2
+        return 1
+      fi
     }; f'
     '''.strip()
 
@@ -145,11 +369,8 @@ def example():
     """Get a console output example for the alias."""
     # Setup the repository
     repo = RepositoryFixture('state-test')
-    repo.run(command())
-    repo.setup_initial_commit()
-    repo.setup_first_changes()
-    repo.stage_file_one()
-    repo.stage_file_two()
+    repo.install(name())
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_one', 'stage_file_two')
     repo.run('rm file-1.txt')
     repo.run('mkdir subdir')
     repo.run('touch subdir/file.txt')
@@ -164,7 +385,7 @@ def test():
     """Test the Git state alias."""
     # Setup
     repo = RepositoryFixture('state-test')
-    repo.run(command())
+    repo.install(name())
     repo.run('mkdir subdir')
     repo.run('touch subdir/file.txt')
 
@@ -189,6 +410,137 @@ def test():
     Verify(output).contains("A file-2.txt")
     Verify(output).contains("?? subdir/file.txt")
 
+    # Paths with spaces are not quoted or split
+    repo.write_file('file with spaces.txt', 'Untracked file.\n')
+    output = repo.print("git state")
+    Verify(output).contains("?? file with spaces.txt")
+
+    # A newline in a path stays in its entry
+    result, = repo.run_batch(["touch 'first\nsecond.txt' && git state; rm 'first\nsecond.txt'"])
+    print(f'$ git state\n{result.stdout}')
+    Verify(repo.clean(result.stdout)).contains("?? first\nsecond.txt")
+    Verify(result.stdout).lacks("Uncategorized")
+
+    # Untracked files can be left out, and rename detection skipped
+    output = repo.print("git state --untracked-files=no --no-renames")
+    Verify(output).contains("A file-1.txt")
+    Verify(output).lacks("untracked file")
+
+    # The summary counts the entries in each category
+    output = repo.print("git state --summary")
+    Verify(output).contains("dev S:2 U:0 C:0 ?:2")
+
+    # A summary that misses its time budget falls back to the last one
+    repo.run('git config core.fsmonitor "sleep 1 #"')
+    output = repo.print("git state --summary --timeout=100")
+    Verify(output).contains("dev S:2 U:0 C:0 ?:2 (stale)")
+    repo.run('git config --unset core.fsmonitor')
+
+    # Let the late summary finish in the background before changing the repository
+    while list(repo.path.glob('.git/state-summary.*')):
+        time.sleep(0.05)
+
+    # A summary that fails falls back to the last one, or says so without a cache
+    failing = "git -c status.showUntrackedFiles=invalid state --summary"
+    fallback, first = repo.run_batch([failing, f"rm .git/state-summary && {failing}"], check=False)
+    if (fallback.returncode, fallback.stdout) != (0, "dev S:2 U:0 C:0 ?:2 (stale)\n"):
+        raise AssertionError(f'A failed summary printed {fallback.stdout!r} and exited with {fallback.returncode}.')
+    if (first.returncode, first.stdout) != (1, "") or "the summary failed" not in first.stderr:
+        raise AssertionError(f'A failed first summary printed {first.stdout!r} and exited with {first.returncode}.')
+    if list(repo.path.glob('.git/state-summary*')):
+        raise AssertionError('A failed summary left a file behind.')
+
+    # Numbers are checked before they are used
+    for option in ("--stream=many", "--timeout=", "--summary --timeout=1s", "--recursive --jobs=-1"):
+        result, = repo.run_batch([f"git state {option}"], check=False)
+        if result.returncode != 1 or not result.stderr.startswith("usage: git state"):
+            raise AssertionError(f'"git state {option}" exited with {result.returncode}:\n{result.stderr}')
+
+    # The number of processes doesn't grow with the number of status lines.
+    # They are counted in a namespace, as the other tests start processes too.
+    counts = []
+    for size in (10, 1000):
+        for index in range(size):
+            repo.write_file(f'scaling-{index}.txt', 'Untracked file.\n')
+        processes = count_processes(repo, 'git state')
+        print(f'git state with {size} untracked files: {processes} processes')
+        counts.append(processes)
+
+    if None not in counts and counts[1] - counts[0] > 100:
+        raise AssertionError(f'git state started {counts[0]} processes for 10 lines and {counts[1]} for 1000 lines.')
+
+    # Streaming prints the finished sections first, with a preview of long ones
+    output = repo.print("git state --stream=5")
+    Verify(output).contains("Branch:")
+    Verify(output).contains("A file-1.txt")
+    Verify(output).contains("... and 997 more")
+
+    # The summaries of the repositories under a directory are grouped by category
+    repo.run_batch([
+        'git init -q projects/clean',
+        'git -C projects/clean commit -q --allow-empty -m "Initial commit"',
+        'git init -q projects/staged',
+        'touch projects/staged/file.txt',
+        'git -C projects/staged add file.txt',
+        'git init -q projects/nested/untracked',
+        'touch projects/nested/untracked/file.txt',
+        'git init -q "projects/a|b"',
+        'git init -q projects/clean/inner && echo inner >> projects/clean/.git/info/exclude', # Not searched
+    ])
+    output = repo.print("git state --all --jobs=2 projects")
+    Verify(output).contains("Repositories: 4")
+    unstaged, staged = output.split('Staged:')
+    staged, clean = staged.split('Clean:')
+    Verify(unstaged).contains(["projects/nested/untracked", "S:0 U:0 C:0 ?:1"])
+    Verify(staged).contains(["projects/staged", "S:1 U:0 C:0 ?:0"])
+    Verify(clean).contains(["projects/clean", "S:0 U:0 C:0 ?:0"])
+    Verify(clean).contains(["projects/a|b", "S:0 U:0 C:0 ?:0"])
+    Verify(output).lacks("inner")
+
+    # The summaries aren't kept in the repositories
+    kept = list(repo.path.glob('projects/**/.git/state-summary'))
+    if kept:
+        raise AssertionError(f'git state --all left summaries behind: {kept}')
+
+    # The directory is relative to where git runs. A repository there is listed
+    # along with the repositories under it.
+    for directory, option, expected in [
+        ('projects/nested', '', ['untracked']),
+        ('projects', ' nested', ['nested/untracked']),
+        ('projects/clean', ' .', ['.', 'inner']),
+    ]:
+        result, = repo.run_batch([f'(cd {directory} && git state --all{option})'])
+        print(f'$ {result.args}\n{result.stdout}')
+        listed = sorted(line.split()[0] for line in repo.clean(result.stdout).splitlines() if line.startswith(' '))
+        if listed != expected:
+            raise AssertionError(f'git state --all{option} in {directory} listed {listed} instead of {expected}.')
+
+    repo.teardown()
+
+    # Changes inside submodules are listed with their paths in the superproject
+    repo = RepositoryFixture('state-recursive-test')
+    repo.install(name())
+    library = RepositoryFixture('state-library')
+    library.setup_snapshot('setup_initial_commit')
+    repo.setup_snapshot('setup_initial_commit')
+    repo.run_batch([
+        f'git -c protocol.file.allow=always submodule add -q "{library.path.absolute()}" vendor/library',
+        'git commit -q -m "Add the library"',
+        'printf "Submodule change.\\n" > vendor/library/file-1.txt',
+        'touch vendor/library/new.txt',
+    ])
+
+    output = repo.print("git state")
+    Verify(output).contains(["vendor/library", "modified file"])
+
+    output = repo.print("git state --recursive")
+    Verify(output).contains(["vendor/library/file-1.txt", "modified file"])
+    Verify(output).contains(["vendor/library/new.txt", "untracked file"])
+    Verify(output).lacks(["vendor/library ", "modified file"])
+
+    output = repo.print("git state --recursive --summary --timeout=0")
+    Verify(output).contains("dev S:0 U:1 C:0 ?:1")
+
     repo.teardown()
 
 if __name__ == '__main__':
@@ -5,9 +5,16 @@ from pathlib import Path
 # Local imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from src.Lib.fixture import RepositoryFixture
+from src.Lib.registry import registry
 from src.Lib.verifier import Verify
 
 
+def name():
+    return 'aliases'
+
+def dependencies():
+    return []
+
 def heading():
     return "Git Aliases"
 
@@ -22,8 +29,9 @@ def command():
 
 def example():
     """Get a console output example for the alias."""
-    # Setup
+    # Setup with every alias installed
     repo = RepositoryFixture('aliases-test')
+    repo.install(*registry().modules)
 
     # Get the console output
     output = repo.run("git aliases")
@@ -35,7 +43,7 @@ def test():
     """Test a Git alias."""
     # Setup
     repo = RepositoryFixture('aliases-test')
-    repo.run(command())
+    repo.install(name())
 
     # Test the alias
     output = repo.print("git aliases")
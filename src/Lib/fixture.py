@@ -1,48 +1,158 @@
 import os
+import re
+import sys
+import uuid
 import shutil
+import hashlib
+import inspect
 import subprocess
 
 from pathlib import Path
 
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from src.Lib import generator
+from src.Lib.registry import registry
+
 BRACKETS = False
+ROOT = Path('repos') # Parent directory for fixture repositories
+CACHE = Path('.fixture-cache') # Snapshots of repository states, kept between runs
+
+GLOBAL_CONFIG = """\
+[user]
+\tname = Repository Fixture
+\temail = fixture@example.com
+"""
+
+# Pinned inputs, so the same steps always produce the same commits and output
+PINNED_ENV = {
+    'COLUMNS': '100',
+    'GIT_AUTHOR_NAME': 'Repository Fixture',
+    'GIT_AUTHOR_EMAIL': 'fixture@example.com',
+    'GIT_AUTHOR_DATE': f'@{generator.EPOCH} +0000',
+    'GIT_COMMITTER_NAME': 'Repository Fixture',
+    'GIT_COMMITTER_EMAIL': 'fixture@example.com',
+    'GIT_COMMITTER_DATE': f'@{generator.EPOCH} +0000',
+    'GIT_FEATURE_SUFFIX': '4d1fc795', # Used by the feature alias instead of a random suffix
+}
+
+def copy_repository(source, destination):
+    """Copy a repository directory. Git never modifies object files in place,
+    so those are hard linked, and everything else is copied."""
+    objects_path = os.path.join('.git', 'objects', '')
+
+    def copy(src, dst):
+        if objects_path in src:
+            try:
+                return os.link(src, dst)
+            except OSError:
+                pass # Different file systems, fall back to a copy
+        return shutil.copy2(src, dst)
+
+    shutil.copytree(source, destination, symlinks=True, copy_function=copy)
+
+_git_version = None
+
+def git_version():
+    """Return the output of git --version, which is run once per process."""
+    global _git_version
+    if _git_version is None:
+        _git_version = subprocess.run(['git', '--version'], capture_output=True, text=True, check=True).stdout
+    return _git_version
+
+_sources = None
+
+def sources_key():
+    """Return a hash of what every snapshot depends on besides its steps: the
+    fixture and generator sources, and the Git version. On first use, the
+    snapshots made from other sources are removed, as nothing can use them."""
+    global _sources
+    if _sources is None:
+        recipe = inspect.getsource(sys.modules[__name__]) + inspect.getsource(generator) + git_version()
+        _sources = hashlib.sha1(recipe.encode()).hexdigest()
+
+        if CACHE.is_dir():
+            for entry in CACHE.iterdir():
+                if entry.is_dir() and not entry.name.startswith(f'{_sources}-'):
+                    shutil.rmtree(entry, ignore_errors=True) # Another process may be removing it too
+    return _sources
+
 
 class RepositoryFixture:
     """Creates an isolated Git repository for testing Git aliases and commands.
     Handles setup, manipulation and teardown of the test repository."""
 
     def __init__(self, name):
-        self.path = Path('repos', name)
+        self.path = Path(ROOT, name)
+        self.home = Path(ROOT, f'{name}-home')
         self.setup()
 
     def setup(self):
         """Set up a Git repository for testing."""
-        if os.path.exists(self.path):
-            shutil.rmtree(self.path)
+        for path in (self.path, self.home):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.makedirs(path, exist_ok=True)
 
-        os.makedirs(self.path, exist_ok=True)
+        self.setup_global_config()
         self.run("git init")
         self.run("git branch -M dev")
 
+    def setup_global_config(self):
+        """Point HOME and the global Git config at a throwaway file for this
+        fixture, so aliases are installed without touching ~/.gitconfig."""
+        config_path = self.home.absolute() / '.gitconfig'
+        with open(config_path, 'w') as f:
+            f.write(GLOBAL_CONFIG)
+
+        self.env = os.environ.copy()
+        self.env.update(PINNED_ENV)
+        self.env.update({
+            'HOME': str(self.home.absolute()),
+            'GIT_CONFIG_GLOBAL': str(config_path),
+            'GIT_CONFIG_NOSYSTEM': '1',
+        })
+
+    def setup_snapshot(self, *steps):
+        """Set up the repository state produced by the named setup methods. A
+        step can also be a (name, kwargs) tuple. The state is built once, cached
+        on disk keyed by a hash of the sources and the steps, and copied into
+        place on later calls."""
+        snapshot = Path(CACHE, f'{sources_key()}-{hashlib.sha1(repr(steps).encode()).hexdigest()}')
+
+        if os.path.exists(snapshot):
+            shutil.rmtree(self.path)
+            copy_repository(snapshot, self.path)
+            return
+
+        for step in steps:
+            name, kwargs = (step, {}) if isinstance(step, str) else step
+            getattr(self, name)(**kwargs)
+
+        # Build next to the final path and rename, so concurrent runs never see a partial snapshot
+        staging = Path(CACHE, f'{snapshot.name}.{os.getpid()}')
+        copy_repository(self.path, staging)
+        try:
+            os.rename(staging, snapshot)
+        except OSError:
+            shutil.rmtree(staging) # Another process cached it first
+
     def teardown(self):
         """Clean up the temporary repository."""
         if os.path.exists(self.path.parent):
             shutil.rmtree(self.path.parent)
 
+    def install(self, *names):
+        """Install the named aliases and the aliases they depend on, in one shell."""
+        aliases = registry()
+        self.run_batch([aliases.module(name).command() for name in aliases.closure(*names)])
+
     def run(self, cmd):
         """Run a git command in this repository and return the output."""
-        env = os.environ.copy()
-        env.update({
-            'COLUMNS': str(shutil.get_terminal_size().columns) # Set terminal width
-        })
-        result = subprocess.run(cmd, cwd=self.path, text=True, shell=True, capture_output=True, env=env)
+        result = subprocess.run(cmd, cwd=self.path, text=True, shell=True, capture_output=True, env=self.env)
 
         if result.returncode != 0:
-            error_msg = f"Command failed with exit code {result.returncode}\n$ {cmd}"
-            if result.stdout:
-                error_msg += f"\nstdout:\n{result.stdout}"
-            if result.stderr:
-                error_msg += f"\nstderr:\n{result.stderr}"
-            raise RuntimeError(error_msg)
+            raise RuntimeError(self.failure_message(result))
 
         if result.stdout.endswith('\n\n'):
             raise RuntimeError(
@@ -61,6 +171,47 @@ class RepositoryFixture:
 
         return f'[{output}]' if BRACKETS else output
 
+    def run_batch(self, cmds, check=True):
+        """Run a list of commands in a single shell session and return a
+        CompletedProcess for each. The shell prints a sentinel line after every
+        command, which is used to split stdout and stderr per command."""
+        sentinel = f'batch-{uuid.uuid4().hex}'
+        script = ''
+
+        for cmd in cmds:
+            script += f'{{\n{cmd}\n}} < /dev/null\n'
+            script += f'batch_status=$?; printf "\\n{sentinel} %d\\n" $batch_status; printf "\\n{sentinel}\\n" >&2\n'
+            if check:
+                script += '[ $batch_status -eq 0 ] || exit $batch_status\n'
+
+        result = subprocess.run('/bin/sh', input=script, cwd=self.path, text=True, capture_output=True, env=self.env)
+
+        stdout_frames = re.split(f'\n{sentinel} (\\d+)\n', result.stdout)
+        stderr_frames = result.stderr.split(f'\n{sentinel}\n')
+        results = []
+
+        for index, cmd in enumerate(cmds[:len(stdout_frames) // 2]):
+            stdout = stdout_frames[index * 2]
+            returncode = int(stdout_frames[index * 2 + 1])
+            results.append(subprocess.CompletedProcess(cmd, returncode, stdout, stderr_frames[index]))
+
+            if check and returncode != 0:
+                raise RuntimeError(self.failure_message(results[-1]))
+
+        if len(results) != len(cmds):
+            raise RuntimeError(f"Batch stopped after {len(results)} of {len(cmds)} commands\n{result.stderr}")
+
+        return results
+
+    def failure_message(self, result):
+        """Describe a failed command with its output for an error message."""
+        error_msg = f"Command failed with exit code {result.returncode}\n$ {result.args}"
+        if result.stdout:
+            error_msg += f"\nstdout:\n{result.stdout}"
+        if result.stderr:
+            error_msg += f"\nstderr:\n{result.stderr}"
+        return error_msg
+
     def print(self, cmd):
         """Run a command in this repository and print the output."""
         output = self.run(cmd)
@@ -86,6 +237,11 @@ class RepositoryFixture:
         with open(os.path.join(self.path, filename), 'w') as f:
             f.write(content)
 
+    def setup_synthetic(self, **size):
+        """Fill the repository with a generated history. The size options are
+        those of SyntheticRepository: files, commits, branches, stashes, dirty."""
+        generator.SyntheticRepository(**size).build(self.path, self.env)
+
     def cat_file_one(self):
         result = self.run("cat file-1.txt")
         return result
@@ -156,6 +312,7 @@ class RepositoryFixture:
 if __name__ == "__main__":
     os.system('clear')
     repo = RepositoryFixture('repo-test')
+    repo.install('state') # The fixture's global config starts without aliases
     repo.setup_first_commit()
     repo.setup_second_commit()
     repo.print("git state") # clean repo
@@ -0,0 +1,146 @@
+import os
+import random
+import tempfile
+import subprocess
+
+from pathlib import Path
+
+IDENTITY = 'Synthetic Repository <synthetic@example.com>'
+EPOCH = 1700000000 # Fixed start date, so generated histories are reproducible
+
+class SyntheticRepository:
+    """Generates a repository of a given size through a single git fast-import
+    stream. The size is set by the number of tracked files, commits on the dev
+    branch, feature branches, stashes, and the ratio of files left modified
+    in the working tree."""
+
+    def __init__(self, files=100, commits=10, branches=0, stashes=0, dirty=0.0, seed=0):
+        self.files = max(files, 1)
+        self.commits = max(commits, 1)
+        self.branches = branches
+        self.stashes = stashes
+        self.dirty = dirty
+        self.random = random.Random(seed)
+        self.mark = 0
+        self.time = EPOCH
+
+    def path(self, index):
+        """Spread the files over directories of 100 files each."""
+        return f'dir-{index // 100:04d}/file-{index:06d}.txt'
+
+    def data(self, text):
+        encoded = text.encode()
+        return b'data %d\n%s\n' % (len(encoded), encoded)
+
+    def commit(self, ref, message, changes, parent=None, merge=None):
+        """Return a fast-import commit command and the mark it was given."""
+        self.mark += 1
+        self.time += 1
+        chunk = b'commit %s\nmark :%d\n' % (ref.encode(), self.mark)
+        chunk += b'committer %s %d +0000\n' % (IDENTITY.encode(), self.time)
+        chunk += self.data(message)
+        if parent:
+            chunk += b'from :%d\n' % parent
+        if merge:
+            chunk += b'merge :%d\n' % merge
+        for index, content in changes:
+            chunk += b'M 100644 inline %s\n' % self.path(index).encode()
+            chunk += self.data(content)
+        return chunk, self.mark
+
+    def revision(self, number):
+        """Pick a random file and give it new content for a revision."""
+        index = self.random.randrange(self.files)
+        return [(index, f'File {index} revision {number}\n')]
+
+    def stream(self):
+        """Yield the fast-import stream in chunks, recording the stash marks."""
+        initial = [(index, f'File {index} revision 0\n') for index in range(self.files)]
+        chunk, tip = self.commit('refs/heads/dev', 'Initial synthetic commit', initial)
+        history = [tip]
+        yield chunk
+
+        for number in range(1, self.commits):
+            chunk, tip = self.commit('refs/heads/dev', f'Synthetic commit {number}', self.revision(number))
+            history.append(tip)
+            yield chunk
+
+        for number in range(self.branches):
+            base = self.random.choice(history)
+            ref = f'refs/heads/feature-dev-{number:08x}'
+            chunk, _ = self.commit(ref, f'Synthetic feature {number}', self.revision(f'feature {number}'), parent=base)
+            yield chunk
+
+        # A stash is a commit of the working tree whose parents are HEAD and a commit of the index
+        self.stash_marks = []
+        for number in range(self.stashes):
+            chunk, index = self.commit('refs/stash', f'index on dev: Synthetic stash {number}', [], parent=tip)
+            yield chunk
+            message = f'On dev: Synthetic stash {number}'
+            chunk, worktree = self.commit('refs/stash', message, self.revision(f'stash {number}'), parent=tip, merge=index)
+            self.stash_marks.append((worktree, self.time, message))
+            yield chunk
+
+    def build(self, path, env=None):
+        """Import the generated history into the repository at the given path,
+        then check it out and modify the dirty share of the files."""
+        with tempfile.TemporaryDirectory() as directory:
+            marks_path = Path(directory, 'marks')
+            importer = subprocess.Popen(
+                ['git', 'fast-import', '--quiet', f'--export-marks={marks_path}'],
+                cwd=path, stdin=subprocess.PIPE, env=env)
+            for chunk in self.stream():
+                importer.stdin.write(chunk)
+            importer.stdin.close()
+
+            if importer.wait() != 0:
+                raise RuntimeError(f'git fast-import failed with exit code {importer.returncode}')
+
+            with open(marks_path) as marks:
+                commits = dict(line.split() for line in marks)
+
+        self.write_stash_reflog(path, commits)
+        subprocess.run(['git', 'reset', '--hard', '--quiet'], cwd=path, env=env, check=True)
+
+        for index in self.random.sample(range(self.files), int(self.files * self.dirty)):
+            with open(Path(path, self.path(index)), 'a') as f:
+                f.write('Uncommitted change.\n')
+
+    def write_stash_reflog(self, path, commits):
+        """fast-import doesn't write reflogs, and the stash list is read from
+        the reflog of refs/stash, so write its entries directly."""
+        if not self.stash_marks:
+            return
+
+        old = '0' * 40
+        log_path = Path(path, '.git', 'logs', 'refs', 'stash')
+        os.makedirs(log_path.parent, exist_ok=True)
+
+        with open(log_path, 'w') as f:
+            for mark, time, message in self.stash_marks:
+                new = commits[f':{mark}']
+                f.write(f'{old} {new} {IDENTITY} {time} +0000\t{message}\n')
+                old = new
+
+
+if __name__ == '__main__':
+    import time
+    import shutil
+
+    os.system('clear')
+
+    path = Path('repos', 'synthetic-test')
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    subprocess.run(['git', 'init', '--quiet', '--initial-branch=dev'], cwd=path, check=True)
+
+    start = time.perf_counter()
+    SyntheticRepository(files=10000, commits=5000, branches=50, stashes=50, dirty=0.1).build(path)
+    print(f'Built {path} in {time.perf_counter() - start:.2f}s\n')
+
+    for cmd in ['git rev-list --count dev', 'git branch --list "feature-*" | wc -l', 'git stash list | head -n3', 'git status --short | wc -l']:
+        print(f'$ {cmd}')
+        subprocess.run(cmd, cwd=path, shell=True)
+
+    shutil.rmtree(path.parent)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+import os
+import sys
+import mmap
+import struct
+import argparse
+import subprocess
+from pathlib import Path
+
+# Local imports
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from src.Lib import state
+
+SIGNATURE = b'DIRC'
+HEADER = struct.Struct('>4sII')
+ENTRY = struct.Struct('>10I20sH') # ctime and mtime (seconds, nanoseconds), dev, ino, mode, uid, gid, size, object ID, flags
+EXTENDED = 0x4000
+SKIP_WORKTREE = 0x4000 # In the extended flags
+INTENT_TO_ADD = 0x2000
+EXTENSION = struct.Struct('>4sI') # Signature and size of an extension after the entries
+
+# The extensions that leave entries out of the index file, which would be read as removed
+UNSUPPORTED = {
+    b'link': 'split index, which keeps most entries in a shared index (git update-index --no-split-index)',
+    b'sdir': 'sparse index, which replaces the entries outside the sparse checkout by directories',
+}
+
+# The status codes of an unmerged path, by which of the base, our and their stages it has
+CONFLICTS = {1: 'DD', 2: 'AU', 3: 'UD', 4: 'UA', 5: 'DU', 6: 'AA', 7: 'UU'}
+
+def find_index(path='.'):
+    """Find the index file of the repository containing a directory, the way
+    git does it, but without running git."""
+    if 'GIT_INDEX_FILE' in os.environ:
+        return Path(os.environ['GIT_INDEX_FILE'])
+
+    directory = Path(path).absolute()
+    for parent in [directory, *directory.parents]:
+        dot_git = parent / '.git'
+        if dot_git.is_dir():
+            return dot_git / 'index'
+        if dot_git.is_file():
+            # Worktrees and submodules point to their Git directory
+            git_dir = dot_git.read_text().strip().removeprefix('gitdir: ')
+            return Path(parent, git_dir) / 'index'
+
+    raise FileNotFoundError(f'Not a Git repository: {directory}')
+
+def read_offset(data, position):
+    """Read a variable length integer of an index v4 path, and return it with the next position."""
+    byte = data[position]
+    value = byte & 0x7f
+    position += 1
+
+    while byte & 0x80:
+        byte = data[position]
+        value = ((value + 1) << 7) | (byte & 0x7f)
+        position += 1
+
+    return value, position
+
+
+class IndexEntry:
+    """An index entry, as shown by `git ls-files --stage`. The path is bytes,
+    as stored in the index."""
+    __slots__ = ('mode', 'oid', 'stage', 'path', 'extended')
+
+    def __init__(self, mode, oid, stage, path, extended=0):
+        self.mode = mode
+        self.oid = oid
+        self.stage = stage
+        self.path = path
+        self.extended = extended
+
+    @property
+    def skip_worktree(self):
+        return bool(self.extended & SKIP_WORKTREE)
+
+    @property
+    def intent_to_add(self):
+        return bool(self.extended & INTENT_TO_ADD)
+
+    def __str__(self):
+        return f'{self.mode:06o} {self.oid} {self.stage}\t{self.path.decode(errors="surrogateescape")}'
+
+
+class IndexReader:
+    """Reads the entries of a Git index file (versions 2 to 4) from a memory
+    map, one at a time. The extensions after the entries are not read, but a
+    split or sparse index raises a ValueError once its entries are reached,
+    as they are not all in the file. Only SHA-1 repositories are supported."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else find_index()
+        self.data = None
+        self.version = 2
+        self.count = 0
+
+        if not self.path.exists():
+            return # No index is written before the first git add
+
+        with open(self.path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, self.version, self.count = HEADER.unpack_from(self.data)
+        if signature != SIGNATURE or self.version not in (2, 3, 4):
+            raise ValueError(f'Unsupported index file: {self.path}')
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yield the entries in index order, parsing each one as it is reached."""
+        if self.data is None:
+            return
+
+        data = self.data
+        offset = HEADER.size
+        previous = b''
+
+        for _ in range(self.count):
+            fields = ENTRY.unpack_from(data, offset)
+            flags = fields[11]
+            position = offset + ENTRY.size
+            extended = 0
+
+            if self.version >= 3 and flags & EXTENDED:
+                extended, = struct.unpack_from('>H', data, position)
+                position += 2
+
+            if self.version == 4:
+                # The path replaces the end of the previous path, and entries are not padded
+                strip, position = read_offset(data, position)
+                end = data.find(b'\0', position)
+                path = previous[:len(previous) - strip] + data[position:end]
+                offset = end + 1
+            else:
+                # The name length saturates for long paths, so look for the terminator
+                end = data.find(b'\0', position)
+                path = data[position:end]
+                offset += (end - offset + 8) & ~7
+
+            previous = path
+            yield IndexEntry(fields[6], fields[10].hex(), (flags >> 12) & 3, path, extended)
+
+        self.check_extensions(offset)
+
+    def check_extensions(self, offset):
+        """Raise a ValueError if an extension from the offset to the final
+        hash means that entries are missing from the file."""
+        end = len(self.data) - 20
+
+        while offset + EXTENSION.size <= end:
+            signature, size = EXTENSION.unpack_from(self.data, offset)
+            if signature in UNSUPPORTED:
+                raise ValueError(f'Unsupported {UNSUPPORTED[signature]}: {self.path}')
+            offset += EXTENSION.size + size
+
+    def close(self):
+        if self.data:
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def head_tree(path='.'):
+    """Return {path: (mode, object ID)} for the files of the HEAD commit,
+    or an empty tree before the first commit."""
+    result = subprocess.run(['git', 'ls-tree', '-r', '-z', '--full-tree', 'HEAD'], cwd=path, capture_output=True)
+    tree = {}
+
+    if result.returncode != 0:
+        return tree
+
+    for record in result.stdout.split(b'\0')[:-1]:
+        info, name = record.split(b'\t', 1)
+        mode, _, oid = info.split(b' ')
+        tree[name] = (int(mode, 8), oid.decode())
+
+    return tree
+
+def staged_changes(reader, tree):
+    """Yield (code, path) for the differences between the index and the HEAD
+    tree, with the status codes of git status --no-renames, in path order.
+    Only the index and the tree are read, never the working tree."""
+    changes = []
+    stages = {}
+
+    for entry in reader:
+        if entry.stage:
+            stages[entry.path] = stages.get(entry.path, 0) | 1 << (entry.stage - 1)
+            continue
+
+        if entry.intent_to_add:
+            continue # Not staged yet, git status lists it as an unstaged addition
+
+        head = tree.pop(entry.path, None)
+        if head is None:
+            changes.append(('A ', entry.path))
+        elif head[0] >> 12 != entry.mode >> 12:
+            changes.append(('T ', entry.path))
+        elif head != (entry.mode, entry.oid):
+            changes.append(('M ', entry.path))
+
+    for path, mask in stages.items():
+        tree.pop(path, None)
+        changes.append((CONFLICTS[mask], path))
+
+    # The tree paths left over were removed from the index
+    changes.extend(('D ', path) for path in tree)
+    return sorted(changes, key=lambda change: change[1])
+
+def render_staged(path='.', output=None):
+    """Print the Conflicts and Staged sections of git state from the index alone."""
+    renderer = state.StateRenderer(state.load_categories(), output=output)
+
+    with IndexReader(find_index(path)) as reader:
+        for code, name in staged_changes(reader, head_tree(path)):
+            renderer.classify(state.Entry(code, name.decode(state.ENCODING)))
+
+    renderer.section('Conflicted', 'Conflicts:')
+    renderer.section('Staged', 'Staged:')
+    renderer.output.flush()
+
+
+def test():
+    """Check the index reader against git ls-files and git diff --cached."""
+    from src.Lib.fixture import RepositoryFixture
+    from src.Lib.verifier import Verify
+
+    def check(version):
+        repo.run(f'git update-index --index-version {version}')
+
+        # Every entry matches git ls-files, byte for byte
+        expected = subprocess.run(['git', 'ls-files', '--stage', '-z'], cwd=repo.path, capture_output=True, env=repo.env).stdout
+        with IndexReader(Path(repo.path, '.git', 'index')) as reader:
+            if reader.version != version:
+                raise AssertionError(f'The index is read as version {reader.version} instead of {version}.')
+            entries = b''.join(b'%06o %s %d\t%s\0' % (e.mode, e.oid.encode(), e.stage, e.path) for e in reader)
+        if entries != expected:
+            raise AssertionError(f'The index v{version} entries differ from git ls-files --stage.')
+
+        # The staged changes match git diff --cached
+        expected = subprocess.run(['git', 'diff', '--cached', '--name-status', '--no-renames', '-z'], cwd=repo.path, capture_output=True, env=repo.env).stdout
+        with IndexReader(Path(repo.path, '.git', 'index')) as reader:
+            changes = b''.join(b'%s\0%s\0' % (code.strip().encode(), name) for code, name in staged_changes(reader, head_tree(repo.path)))
+        if changes != expected:
+            raise AssertionError(f'The index v{version} staged changes differ from git diff --cached.')
+
+    # Setup a synthetic repository with staged changes of every kind
+    repo = RepositoryFixture('index-test')
+
+    # A new repository has no index file yet, which reads as no entries
+    for option in ('', ' --staged'):
+        result, = repo.run_batch([f'{sys.executable} "{Path(__file__).resolve()}"{option}'], check=False)
+        if (result.returncode, result.stdout) != (0, ''):
+            raise AssertionError(f'Reading a missing index{option} exited with {result.returncode}:\n{result.stdout}{result.stderr}')
+
+    repo.setup_snapshot(('setup_synthetic', {'files': 2000, 'commits': 5, 'dirty': 0.01}))
+    repo.run_batch([
+        'git add -u',
+        'git rm -q --cached dir-0001/file-000100.txt',
+        'printf "New file.\\n" > "dir-0002/new file.txt" && git add "dir-0002/new file.txt"',
+        'ln -s file-000000.txt dir-0000/file-000001.txt.link && git add dir-0000/file-000001.txt.link',
+        'git update-index --chmod=+x dir-0004/file-000400.txt',
+    ])
+
+    # Git only writes version 3 when an entry has extended flags
+    for version in (2, 4):
+        check(version)
+
+    # Extended flags need version 3 or later
+    repo.run_batch([
+        'printf "Intent to add.\\n" > intent.txt && git add -N intent.txt',
+        'git update-index --skip-worktree dir-0003/file-000300.txt',
+    ])
+
+    for version in (3, 4):
+        check(version)
+
+    with IndexReader(Path(repo.path, '.git', 'index')) as reader:
+        flagged = {entry.path: entry for entry in reader if entry.extended}
+    if not flagged[b'intent.txt'].intent_to_add or not flagged[b'dir-0003/file-000300.txt'].skip_worktree:
+        raise AssertionError('The extended flags of the index entries are not read.')
+
+    # Unmerged paths get the codes of git status
+    repo.run_batch([
+        'git update-index --no-skip-worktree dir-0003/file-000300.txt && git rm -q --cached intent.txt',
+        'git commit -q -m "Commit the staged changes"',
+        'git checkout -q -b other && printf "Other.\\n" > dir-0000/file-000000.txt && git commit -q -m "Other change" dir-0000/file-000000.txt',
+        'git checkout -q dev && printf "Dev.\\n" > dir-0000/file-000000.txt && git commit -q -m "Dev change" dir-0000/file-000000.txt',
+        'git merge -q other || true',
+    ])
+    with IndexReader(Path(repo.path, '.git', 'index')) as reader:
+        changes = staged_changes(reader, head_tree(repo.path))
+    if changes != [('UU', b'dir-0000/file-000000.txt')]:
+        raise AssertionError(f'The unmerged path is read as {changes}.')
+    repo.run('git merge --abort && git reset -q --soft HEAD~2')
+
+    # The staged section matches the one of git state, apart from the padding
+    repo.install('state')
+    output = repo.print(f'{sys.executable} "{Path(__file__).resolve()}" --staged')
+    Verify(output).contains(['A ', 'dir-0002/new file.txt', 'added new file'])
+    Verify(output).contains(['D ', 'dir-0001/file-000100.txt', 'deleted file'])
+    Verify(output).lacks('intent.txt')
+
+    def normalize(text):
+        section = text[text.index('Staged:'):].split('\n\n')[0]
+        return [' '.join(line.split()) for line in section.splitlines()]
+
+    expected = repo.run('git state --no-renames -uno')
+    if normalize(output) != normalize(expected):
+        raise AssertionError(f'The staged section differs from git state.\n{output}\n{expected}')
+
+    # Split and sparse indexes leave entries out of the file, so they are refused
+    for setup, undo in [
+        ('git update-index --split-index', 'git update-index --no-split-index'),
+        ('git sparse-checkout set --cone --sparse-index dir-0000', 'git sparse-checkout disable'),
+    ]:
+        repo.run(setup)
+        try:
+            with IndexReader(Path(repo.path, '.git', 'index')) as reader:
+                staged_changes(reader, head_tree(repo.path))
+        except ValueError as error:
+            print(error)
+        else:
+            raise AssertionError(f'The index was read after "{setup}".')
+        repo.run(undo)
+
+    repo.teardown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read the Git index of the current repository without running git status.')
+    parser.add_argument('--staged', action='store_true', help='print the staged changes like git state, instead of the entries')
+    args = parser.parse_args()
+
+    if args.staged:
+        render_staged()
+    else:
+        with IndexReader() as reader:
+            for entry in reader:
+                print(entry)
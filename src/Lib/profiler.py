@@ -0,0 +1,67 @@
+import os
+import time
+import subprocess
+
+from pathlib import Path
+
+LAST_PID = Path('/proc/sys/kernel/ns_last_pid')
+
+def last_pid():
+    """Return the most recently assigned process ID, or None where the kernel
+    doesn't expose it (only Linux does)."""
+    try:
+        return int(LAST_PID.read_text())
+    except OSError:
+        return None
+
+def profile(repo, cmd):
+    """Run a command in a fixture repository and return its wall time in
+    seconds and the number of processes it started. The process count is the
+    number of PIDs handed out while it ran, so it also counts anything else
+    that started on the machine at the same time, and is None off Linux."""
+    first_pid = last_pid()
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=repo.path, text=True, shell=True, capture_output=True, env=repo.env)
+    seconds = time.perf_counter() - start
+    final_pid = last_pid()
+
+    if result.returncode != 0:
+        raise RuntimeError(repo.failure_message(result))
+
+    processes = final_pid - first_pid if first_pid is not None else None
+    return seconds, processes
+
+def count_processes(repo, cmd):
+    """Return the number of processes a command starts, counted in a private
+    PID namespace so nothing else running on the machine is included. Returns
+    None where unshare can't create the namespace."""
+    script = f'{{ {cmd}\n}} > /dev/null; status=$?; cat /proc/sys/kernel/ns_last_pid; exit $status'
+    namespace = ['unshare', '--user', '--map-root-user', '--pid', '--fork', '--mount-proc', 'sh', '-c', script]
+
+    try:
+        result = subprocess.run(namespace, cwd=repo.path, text=True, capture_output=True, env=repo.env)
+    except OSError:
+        return None
+
+    if result.returncode != 0 and result.stderr.startswith('unshare:'):
+        return None
+    if result.returncode != 0:
+        raise RuntimeError(repo.failure_message(result))
+
+    # The shell is PID 1 of the namespace, and cat takes the last PID
+    return int(result.stdout.split()[-1]) - 2
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.path.append(str(Path(__file__).parent.parent.parent))
+    from src.Lib.fixture import RepositoryFixture
+
+    os.system('clear')
+
+    repo = RepositoryFixture('profiler-test')
+    for cmd in ['true', 'git status', 'git status | cat | cat']:
+        seconds, processes = profile(repo, cmd)
+        print(f'{cmd:<24} {seconds * 1000:8.1f}ms {processes} processes ({count_processes(repo, cmd)} of its own)')
+    repo.teardown()
@@ -0,0 +1,71 @@
+import sys
+import importlib
+from pathlib import Path
+from graphlib import TopologicalSorter
+
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+ALIASES_PATH = Path(__file__).parent.parent / 'Aliases'
+
+
+class AliasRegistry:
+    """Loads the alias modules once, and indexes them by the name they declare.
+    The dependencies of an alias are the other aliases its command runs, which
+    have to be installed wherever it is. The names of the modules handed out
+    are kept in used, so a test run can tell which aliases it relied on."""
+
+    def __init__(self, path=ALIASES_PATH):
+        files = sorted(Path(path).glob('*.py'), key=lambda f: f.name)
+        self.modules = {}
+        self.used = set()
+
+        for file in files:
+            module = importlib.import_module(f'src.Aliases.{file.stem}')
+            self.modules[module.name()] = module
+
+        for name, module in self.modules.items():
+            for dependency in module.dependencies():
+                if dependency not in self.modules:
+                    raise KeyError(f'The {name} alias depends on an unknown alias: {dependency}')
+
+        self.graph = {name: module.dependencies() for name, module in self.modules.items()}
+        TopologicalSorter(self.graph).prepare() # Raises CycleError for circular dependencies
+
+    def __iter__(self):
+        self.used.update(self.modules)
+        return iter(self.modules.values())
+
+    def module(self, name):
+        self.used.add(name)
+        return self.modules[name]
+
+    def module_graph(self):
+        """Return {module name: module names of its dependencies}, to schedule the unit tests."""
+        return {module.__name__: {self.modules[name].__name__ for name in self.graph[module.name()]} for module in self}
+
+    def closure(self, *names):
+        """Return the given aliases and everything they depend on, dependencies
+        first, and otherwise in the given order, so installs are reproducible."""
+        ordered = []
+
+        def visit(name):
+            if name not in ordered:
+                for dependency in self.graph[name]:
+                    visit(dependency)
+                ordered.append(name)
+
+        for name in names:
+            visit(name)
+
+        return ordered
+
+
+_registry = None
+
+def registry():
+    """Return the registry, built on first use."""
+    global _registry
+    if _registry is None:
+        _registry = AliasRegistry()
+    return _registry
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+import re
+import sys
+import argparse
+import importlib
+import subprocess
+from pathlib import Path
+
+# Local imports, resolved so the module also works through a git-state symlink
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+CHUNK_SIZE = 1 << 16
+USAGE = 'git state [--no-renames] [--untracked-files=<mode>] [--stream[=<lines>]] [--summary]'
+
+# Paths are kept as bytes decoded one to one, so widths are counted in bytes like awk does
+ENCODING = 'latin-1'
+
+def load_categories():
+    """Read the category table from the state alias, so both engines classify
+    the status codes from the same rows. Returns {code: (category, description)}."""
+    command = importlib.import_module('src.Aliases.9-state').command()
+    table = re.search(r'categories="\n(.*?)\n"', command, re.S).group(1)
+    categories = {}
+
+    for row in table.splitlines():
+        category, description = row[3:].split('|')
+        categories[row[:2]] = (category, description)
+
+    return categories
+
+def yellow(text):
+    return f'\033[1;33m{text}\033[0m'
+
+
+class Entry:
+    """A status entry: its two letter code, and the text shown for it, which
+    is the path or "<original path> -> <path>" for a rename or copy."""
+    __slots__ = ('code', 'text')
+
+    def __init__(self, code, text):
+        self.code = code
+        self.text = text
+
+
+class Branch:
+    """The branch headers of a porcelain v2 status."""
+    __slots__ = ('head', 'initial', 'upstream', 'ahead', 'behind', 'tracking')
+
+    def __init__(self):
+        self.head = ''
+        self.initial = False
+        self.upstream = ''
+        self.ahead = 0
+        self.behind = 0
+        self.tracking = False
+
+    def header(self, record):
+        """Update the branch from a "# branch.<key> <value>" header record."""
+        fields = record.split(' ')
+        if fields[1] == 'branch.oid':
+            self.initial = fields[2] == '(initial)'
+        elif fields[1] == 'branch.head':
+            self.head = fields[2]
+        elif fields[1] == 'branch.upstream':
+            self.upstream = fields[2]
+        elif fields[1] == 'branch.ab':
+            self.ahead = int(fields[2][1:])
+            self.behind = int(fields[3][1:])
+            self.tracking = True
+
+    def describe(self):
+        if self.initial:
+            return f'No commits yet on {self.head}'
+        if self.head == '(detached)':
+            return 'HEAD (no branch)'
+        if not self.upstream:
+            return self.head
+
+        branch = f'{self.head}...{self.upstream}'
+        if not self.tracking:
+            return f'{branch} [gone]'
+        if self.ahead and self.behind:
+            return f'{branch} [ahead {self.ahead}, behind {self.behind}]'
+        if self.ahead:
+            return f'{branch} [ahead {self.ahead}]'
+        if self.behind:
+            return f'{branch} [behind {self.behind}]'
+        return branch
+
+
+class Section:
+    """The entries of one section, only up to the preview limit when streaming."""
+    __slots__ = ('total', 'entries', 'width', 'printed')
+
+    def __init__(self):
+        self.total = 0
+        self.entries = []
+        self.width = 0
+        self.printed = False
+
+
+def records(stream):
+    """Yield the NUL-terminated records of a status stream as they arrive."""
+    pending = b''
+
+    while chunk := stream.read1(CHUNK_SIZE):
+        *complete, pending = (pending + chunk).split(b'\0')
+        for record in complete:
+            yield record.decode(ENCODING)
+
+    if pending:
+        yield pending.decode(ENCODING)
+
+def parse(stream, branch):
+    """Yield an Entry for each status entry, and update the branch from the headers."""
+    records_iterator = records(stream)
+
+    for record in records_iterator:
+        kind = record[:1]
+
+        if kind == '#':
+            if record.startswith('# branch.'):
+                branch.header(record)
+        elif kind == '?' or kind == '!':
+            yield Entry(kind + kind, record[2:])
+        elif kind:
+            # Ordinary, renamed and unmerged entries have 8, 9 and 10 fields before the path
+            skip = 8 if kind == '1' else 9 if kind == '2' else 10
+            fields = record.split(' ', skip)
+            code = fields[1].replace('.', ' ')
+
+            if kind == '2':
+                # The original path of a rename or copy is the next record
+                yield Entry(code, f'{next(records_iterator)} -> {fields[skip]}')
+            else:
+                yield Entry(code, fields[skip])
+
+
+class StateRenderer:
+    """Classifies status entries into the sections of git state and writes
+    the same output as the shell alias."""
+
+    def __init__(self, categories, limit=0, summary=False, progress=False, output=None):
+        self.categories = categories
+        self.limit = limit
+        self.summary = summary
+        self.progress = progress
+        self.output = output or sys.stdout.buffer
+        self.branch = Branch()
+        self.sections = {name: Section() for name in ('Conflicted', 'Unstaged', 'Staged', 'Uncategorized')}
+        self.width = 0
+        self.untracked = 0
+        self.classified = 0
+        self.headed = False
+
+    def write(self, text):
+        self.output.write(text.encode(ENCODING))
+
+    def add(self, name, code, text):
+        section = self.sections[name]
+        section.total += 1
+        if self.summary or (self.limit and section.total > self.limit):
+            return
+
+        section.entries.append((code, text))
+        section.width = max(section.width, len(text) + 2)
+        self.width = max(self.width, section.width)
+
+    def classify(self, entry):
+        text = ' ' + entry.text
+        category = self.categories.get(entry.code, ('Uncategorized',))[0]
+        if entry.code == '??':
+            self.untracked += 1
+
+        if category == 'Mixed':
+            self.add('Unstaged', ' ' + entry.code[1], text)
+            self.add('Staged', entry.code[0] + ' ', text)
+        else:
+            self.add(category, entry.code, text)
+
+        self.classified += 1
+        if self.progress and self.classified % 1000 == 0:
+            sys.stderr.write(f'\rClassified {self.classified} entries')
+            sys.stderr.flush()
+
+    def describe(self, code):
+        return yellow(self.categories[code][1] if code in self.categories else 'unrecognized status code')
+
+    def heading(self):
+        branch = self.branch.describe()
+        self.width = max(self.width, len(branch) + 3)
+        self.write(f'{yellow("Branch:")} {branch}\n')
+        self.headed = True
+
+    def section(self, name, title):
+        """Sections are padded to the widest line overall, or to their own widest line when streaming."""
+        section = self.sections[name]
+        section.printed = True
+        if not section.total:
+            return
+
+        padding = section.width if self.limit else self.width
+        self.write(f'\n{yellow(title)}\n')
+        for code, text in section.entries:
+            self.write(f'{yellow(code)}{text}{" " * (padding - len(text) + 2)}{self.describe(code)}\n')
+        if section.total > len(section.entries):
+            self.write(yellow(f'... and {section.total - len(section.entries)} more') + '\n')
+        self.output.flush()
+
+    def feed(self, entry):
+        if self.limit and not self.headed:
+            self.heading()
+            self.output.flush()
+
+        # Untracked and ignored files come last, so the tracked sections are complete
+        if self.limit and entry.code in ('??', '!!') and not self.sections['Staged'].printed:
+            self.section('Conflicted', 'Conflicts:')
+            self.section('Staged', 'Staged:')
+
+        self.classify(entry)
+
+    def finish(self):
+        if self.summary:
+            sections = self.sections
+            head = 'HEAD' if self.branch.head == '(detached)' else self.branch.head
+            line = (f'{head} S:{sections["Staged"].total} U:{sections["Unstaged"].total - self.untracked} '
+                    f'C:{sections["Conflicted"].total} ?:{self.untracked}')
+            if sections['Uncategorized'].total:
+                line += f' X:{sections["Uncategorized"].total}'
+            self.write(line + '\n')
+            return
+
+        if self.progress and self.classified >= 1000:
+            sys.stderr.write('\r\033[K')
+        if not self.headed:
+            self.heading()
+        for name, title in (('Conflicted', 'Conflicts:'), ('Unstaged', 'Unstaged:'), ('Staged', 'Staged:'), ('Uncategorized', 'Uncategorized:')):
+            if not self.sections[name].printed:
+                self.section(name, title)
+
+    def render(self, stream):
+        """Render the git state from a porcelain v2 -z --branch status stream."""
+        for entry in parse(stream, self.branch):
+            self.feed(entry)
+        self.finish()
+        self.output.flush()
+
+
+def status_command(untracked='all', renames=True, locks=True):
+    command = ['git'] if locks else ['git', '--no-optional-locks']
+    command += ['status', '--porcelain=v2', '-z', '--branch', f'--untracked-files={untracked}']
+    return command if renames else command + ['--no-renames']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='git state', usage=USAGE, description='Show the current state of the working directory and staging area.')
+    parser.add_argument('--no-renames', action='store_true', help='skip rename detection')
+    parser.add_argument('-u', '--untracked-files', nargs='?', const='all', default='all', help='no, normal or all (the default)')
+    parser.add_argument('--stream', nargs='?', const=20, default=0, type=int, metavar='LINES', help='print each section as soon as it is complete, with only its first lines')
+    parser.add_argument('--summary', action='store_true', help='print only the branch and a count per category')
+    args = parser.parse_args(argv)
+
+    renderer = StateRenderer(load_categories(), limit=args.stream, summary=args.summary, progress=args.stream > 0 and sys.stderr.isatty())
+    command = status_command(args.untracked_files, not args.no_renames, not args.summary)
+
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+        renderer.render(process.stdout)
+
+    return process.returncode
+
+
+def test():
+    """Check that the Python engine prints the same output as the alias."""
+    from src.Lib.fixture import RepositoryFixture
+
+    # Setup
+    repo = RepositoryFixture('state-engine-test')
+    repo.install('state')
+    engine = f'{sys.executable} "{Path(__file__).resolve()}"'
+
+    def compare(*args):
+        options = ' '.join(args)
+        expected = repo.run(f'git state {options}').split('\n', 1)[1]
+        output = repo.run(f'{engine} {options}').split('\n', 1)[1]
+        if output != expected:
+            raise AssertionError(f'The engine output for "{options}" differs from the alias.\n'
+                                 f'Alias:\n{expected}\nEngine:\n{output}')
+
+    compare()
+    compare('--summary')
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes', 'stage_file_one')
+    repo.run_batch([
+        'git mv file-1.txt "renamed file.txt"',
+        'printf "Staged.\\n" > staged.txt && git add staged.txt && printf "Mixed.\\n" >> staged.txt',
+        'rm file-2.txt',
+        'mkdir subdir && touch subdir/file.txt "subdir/naïve.txt"',
+    ])
+
+    for args in [(), ('--no-renames',), ('-uno',), ('--untracked-files=normal',), ('--summary',), ('--stream=1',)]:
+        compare(*args)
+
+    # Conflicts, and a detached HEAD
+    repo.run_batch([
+        'git add -A && git commit -q -m "Commit the changes"',
+        'git checkout -q -b other && printf "Other.\\n" > staged.txt && git commit -q -am "Other change"',
+        'git checkout -q dev && printf "Dev.\\n" > staged.txt && git commit -q -am "Dev change"',
+        'git merge -q other || true',
+    ])
+    compare()
+    compare('--summary')
+    repo.run('git merge --abort && git checkout -q --detach')
+    compare()
+
+    repo.teardown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import math
+import argparse
+from pathlib import Path
+
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent))
+from src.Lib.fixture import RepositoryFixture
+from src.Lib.profiler import profile
+
+STATE_ENGINE = Path(__file__).parent.absolute() / 'Lib' / 'state.py'
+
+class AliasBenchmark:
+    """Runs the aliases against generated repositories of growing size, and
+    records the wall time and number of processes started for each run."""
+
+    def __init__(self, sizes, cases=None):
+        self.sizes = sizes
+        self.results = []
+        self.cases = [case for case in self.all_cases() if not cases or case[0] in cases]
+
+    def all_cases(self):
+        return [
+            ('state', 'git state', 'dirty files', self.bench_state),
+            ('state-py', 'state.py', 'dirty files', self.bench_state_engine),
+            ('last', 'git last', 'commits', self.bench_last),
+            ('hidden', 'git hidden', 'stashes', self.bench_hidden),
+            ('pluck', 'git pluck', 'stashes', self.bench_pluck),
+            ('refresh', 'git refresh', 'feature branches', self.bench_refresh),
+        ]
+
+    def run(self):
+        """Run the selected benchmark cases at every size."""
+        for _, command, unit, case in self.cases:
+            for size in self.sizes:
+                seconds, processes = case(size)
+                self.results.append({
+                    'command': command,
+                    'unit': unit,
+                    'size': size,
+                    'seconds': seconds,
+                    'processes': processes,
+                })
+                print(f'{command} ({size} {unit}): {seconds:.3f}s', flush=True)
+
+    def bench_state(self, size):
+        repo = RepositoryFixture('bench-state')
+        repo.setup_snapshot(('setup_synthetic', {'files': size, 'commits': 1, 'dirty': 1.0}))
+        repo.install('state')
+        result = profile(repo, 'git state')
+        repo.teardown()
+        return result
+
+    def bench_state_engine(self, size):
+        repo = RepositoryFixture('bench-state-engine')
+        repo.setup_snapshot(('setup_synthetic', {'files': size, 'commits': 1, 'dirty': 1.0}))
+        result = profile(repo, f'"{sys.executable}" "{STATE_ENGINE}"')
+        repo.teardown()
+        return result
+
+    def bench_last(self, size):
+        repo = RepositoryFixture('bench-last')
+        repo.setup_snapshot(('setup_synthetic', {'files': 100, 'commits': size}))
+        repo.install('last')
+        result = profile(repo, 'git last')
+        repo.teardown()
+        return result
+
+    def bench_hidden(self, size):
+        repo = RepositoryFixture('bench-hidden')
+        repo.setup_snapshot(('setup_synthetic', {'files': 100, 'commits': 10, 'stashes': size}))
+        repo.install('hide', 'unhide', 'state')
+        repo.write_file('hidden.txt', 'Hidden change.\n')
+        repo.run('git add hidden.txt && git commit -q -m "Add hidden.txt"')
+        repo.write_file('hidden.txt', 'Hidden change, revised.\n')
+        repo.run('git hide')
+        result = profile(repo, 'git hidden')
+        repo.teardown()
+        return result
+
+    def bench_pluck(self, size):
+        repo = RepositoryFixture('bench-pluck')
+        repo.setup_snapshot(('setup_synthetic', {'files': 100, 'commits': 10, 'stashes': size}))
+        repo.install('pluck')
+        result = profile(repo, f'git pluck {size - 1}')
+        repo.teardown()
+        return result
+
+    def bench_refresh(self, size):
+        remote = RepositoryFixture('bench-refresh-remote')
+        remote.setup_snapshot(('setup_synthetic', {'files': 100, 'commits': 10}))
+
+        local = RepositoryFixture('bench-refresh-local')
+        local.install('refresh')
+        branches = ''.join(f'create refs/heads/feature-dev-{number:08x} HEAD\n' for number in range(size))
+        local.run_batch([
+            f'git remote add origin "{remote.path.absolute()}"',
+            'git fetch -q origin',
+            'git reset -q --hard origin/dev',
+            'git branch -q --set-upstream-to=origin/dev dev',
+            f'printf "{branches}" | git update-ref --stdin',
+            'git checkout -q feature-dev-00000000',
+        ])
+        local.write_file('dir-0000/file-000000.txt', 'Uncommitted change.\n')
+
+        result = profile(local, 'git refresh')
+        local.teardown()
+        return result
+
+    def print_table(self):
+        """Print the results with the growth exponent between sizes. An
+        exponent near 1 means linear scaling, above 1 means it gets worse."""
+        print(f'\n{"Command":<14}{"Size":>9}  {"Unit":<18}{"Seconds":>9}{"Processes":>11}{"Exponent":>10}')
+        previous = None
+
+        for result in self.results:
+            exponent = ''
+            if previous and previous['command'] == result['command'] and previous['seconds'] > 0:
+                growth = math.log(result['seconds'] / previous['seconds'])
+                exponent = f'{growth / math.log(result["size"] / previous["size"]):.2f}'
+
+            processes = result['processes'] if result['processes'] is not None else '-'
+            print(f'{result["command"]:<14}{result["size"]:>9}  {result["unit"]:<18}'
+                  f'{result["seconds"]:>9.3f}{processes:>11}{exponent:>10}')
+            previous = result
+
+    def save(self, path):
+        """Save the results as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.results, f, indent=2)
+        print(f'\nSaved results to {path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the aliases on repositories of growing size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='repository sizes to run each alias against')
+    parser.add_argument('--output', default='bench.json', help='path of the JSON results file')
+    parser.add_argument('--cases', nargs='+', choices=[case[0] for case in AliasBenchmark([]).all_cases()], help='only run these cases')
+    args = parser.parse_args()
+
+    os.system('clear')
+    benchmark = AliasBenchmark(args.sizes, args.cases)
+    benchmark.run()
+    benchmark.print_table()
+    benchmark.save(args.output)
@@ -1,18 +1,54 @@
 import os
 import sys
+import json
+import argparse
 from pathlib import Path
 
 # Local imports
 from test import TestRunner
 sys.path.append(str(Path(__file__).parent.parent))
+from src.Lib import fixture
+from src.Lib.registry import registry
+from src.install import write_atomic
+
+EXAMPLES = Path(fixture.CACHE, 'examples.json') # Rendered console examples
+
+
+class ExampleCache:
+    """Keeps the console examples, keyed like the test results by the
+    module and the aliases it used. The fixtures pin dates, identity and the
+    feature suffix, so an example only changes when its inputs do."""
+
+    def __init__(self, results, path=EXAMPLES, force=False):
+        self.results = results
+        self.path = Path(path)
+        self.force = force
+        self.examples = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def render(self, module):
+        """Return the example of a module, running it only if its key changed."""
+        cached = self.examples.get(module.__name__)
+        if cached and not self.force and cached['key'] == self.results.key(module, cached['aliases']):
+            return cached['output']
+
+        registry().used.clear()
+        output = module.example()
+        aliases = self.results.aliases(module, registry().used)
+        self.examples[module.__name__] = {'key': self.results.key(module, aliases), 'aliases': aliases, 'output': output}
+        return output
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps(self.examples, indent=2, sort_keys=True))
 
 
 class ReadmeGenerator:
     """Generate the README.md file from the alias modules."""
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, force=False):
         """Initialize the Readme Generator."""
-        self.test_runner = TestRunner()
+        self.test_runner = TestRunner(force)
+        self.examples = ExampleCache(self.test_runner.cache, force=force)
         self.readme_path = file_path
         self.initialize_new_readme()
         self.generate_readme()
@@ -32,15 +68,18 @@ class ReadmeGenerator:
         ]
 
         content_lines.extend([
-            '\nTo install these aliases, either run the respective commands individually, or execute the test script:\n',
+            '\nTo install these aliases, either run the respective commands individually, or execute the installer, which writes them to one file included from the global config (the test script installs them the same way once the tests pass):\n',
             '```bash',
-            'python3 src/test.py',
+            'python3 src/install.py',
             '```\n'
         ])
 
         content_lines.extend([
             '\nTo remove the aliases, you can use these commands:\n',
             '```bash',
+            '# Remove the aliases written by the installer',
+            'python3 src/install.py --uninstall',
+            '',
             '# Remove a specific alias'
         ])
 
@@ -55,12 +94,14 @@ class ReadmeGenerator:
             '```\n'
         ])
 
+        # Make sure the unit tests pass, which skips the ones that passed unchanged
+        self.test_runner.run_tests()
+
         for module in self.test_runner.alias_modules:
-            module.test() # Make sure the unit test passes
             heading = module.heading()
             description = module.description()
             command = module.command()
-            console = module.example()
+            console = self.examples.render(module)
 
             content_lines.extend([
               f'## {heading}\n',
@@ -69,6 +110,7 @@ class ReadmeGenerator:
               f'```console\n{console}\n```\n'
             ])
 
+        self.examples.save()
         content = '\n'.join(content_lines)
 
         with open(self.readme_path, 'w') as f:
@@ -88,5 +130,9 @@ class ReadmeGenerator:
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the README from the alias modules.')
+    parser.add_argument('--force', action='store_true', help='run every unit test and example, even the cached ones')
+    args = parser.parse_args()
+
     os.system('clear')
-    ReadmeGenerator('README.md')
+    ReadmeGenerator('README.md', args.force)
@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import shlex
+import argparse
+import subprocess
+from pathlib import Path
+
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent))
+from src.Lib.fixture import RepositoryFixture
+from src.Lib.profiler import profile
+from src.Lib.registry import registry
+from src.Lib.verifier import Verify
+
+INCLUDE_FILE = Path('.config', 'git', 'aliases.gitconfig') # Relative to the home directory
+
+# Git runs shell aliases from the top of the working tree, so the scripts do the same
+SCRIPT = '''#!/bin/sh
+# Generated from src/Aliases/{source} by src/install.py
+cdup=$(git rev-parse --show-cdup 2> /dev/null) && cd "./$cdup"
+{body}
+'''
+
+def parse_command(command):
+    """Return the alias name and the alias value of a `git config --global alias.<name> '<value>'` command."""
+    arguments = shlex.split(command)
+    return arguments[-2].removeprefix('alias.'), arguments[-1]
+
+def script_body(value):
+    """Turn a shell alias value into the body of a script. Git appends the
+    arguments to the alias, which only works for the aliases that end by
+    calling a function they define, so the others ignore their arguments."""
+    body = value.removeprefix('!').rstrip()
+    call = re.search(r'(?:^|[;&|\s])(\w+)$', body)
+
+    if call and re.search(rf'(?:^|[;&|\s]){call.group(1)}\(\)\s*\{{', body):
+        return f'{body} "$@"'
+    return body
+
+def quote_value(value):
+    """Quote a value for a Git config file, escaping what git unescapes when reading it."""
+    for character, escaped in (('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\t', '\\t')):
+        value = value.replace(character, escaped)
+    return f'"{value}"'
+
+def write_atomic(path, content, mode=0o644):
+    """Write a file next to its destination and rename it into place, so a
+    running git sees either the old file or the new one, never a partial one."""
+    staging = path.with_name(f'.{path.name}.{os.getpid()}')
+    staging.write_text(content)
+    staging.chmod(mode)
+    os.replace(staging, path)
+
+
+class AliasInstaller:
+    """Installs the aliases into the global Git config, into a generated
+    config file included from it, or as git-<name> scripts in a bin directory,
+    which leaves the config small."""
+
+    def __init__(self, env=None):
+        self.env = env
+        self.home = Path(env['HOME']) if env else Path.home()
+        self.aliases = [(module, *parse_command(module.command())) for module in registry()]
+
+    @property
+    def names(self):
+        return [name for module, name, value in self.aliases]
+
+    def git_config(self, *args, check=True):
+        return subprocess.run(['git', 'config', '--global', *args], env=self.env, check=check, capture_output=True, text=True)
+
+    def install_config(self):
+        """Install each alias into the global Git config."""
+        for module, name, value in self.aliases:
+            self.git_config(f'alias.{name}', value)
+
+    def remove_config(self):
+        """Remove the known aliases set one by one in the global Git config,
+        and return their names."""
+        existing = self.git_config('--name-only', '--get-regexp', r'^alias\.', check=False).stdout.split()
+        removed = [name for name in self.names if f'alias.{name}' in existing]
+
+        for name in removed:
+            self.git_config('--unset', f'alias.{name}')
+
+        return removed
+
+    def render_include(self):
+        """Render all the aliases as one config file."""
+        lines = ['# Generated from src/Aliases by src/install.py, changes are overwritten', '[alias]']
+        for module, name, value in self.aliases:
+            lines.append(f'\t{name} = {quote_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def include_path(self, path=None):
+        return Path(path or self.home / INCLUDE_FILE).absolute()
+
+    def install_include(self, path=None):
+        """Write the aliases to one config file in a single rename, and include
+        it from the global config. Installing again replaces every alias at once."""
+        path = self.include_path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, self.render_include())
+
+        # The aliases set one by one would take precedence over the included ones
+        self.remove_config()
+        if self.git_config('--get', '--fixed-value', 'include.path', str(path), check=False).returncode != 0:
+            self.git_config('--add', 'include.path', str(path))
+
+    def remove_include(self, path=None):
+        """Remove the included config file, which removes every alias at once,
+        then the include itself."""
+        path = self.include_path(path)
+        if path.exists():
+            path.unlink()
+        if self.git_config('--get', '--fixed-value', 'include.path', str(path), check=False).returncode == 0:
+            self.git_config('--unset', '--fixed-value', 'include.path', str(path))
+
+    def install_bin(self, directory):
+        """Write each alias as an executable git-<name> script, which git runs
+        for `git <name>`, and remove the aliases from the global config."""
+        os.makedirs(directory, exist_ok=True)
+
+        for module, name, value in self.aliases:
+            script = SCRIPT.format(source=Path(module.__file__).name, body=script_body(value))
+            write_atomic(Path(directory, f'git-{name}'), script, 0o755)
+
+        self.remove_config()
+
+    def remove_bin(self, directory):
+        """Remove the git-<name> scripts from a bin directory."""
+        for module, name, value in self.aliases:
+            path = Path(directory, f'git-{name}')
+            if path.exists():
+                path.unlink()
+
+
+def benchmark(runs=200):
+    """Compare the startup time of git with the aliases in the global config
+    and with the aliases installed as scripts, both for an unrelated git
+    command and for the aliases themselves."""
+    repo = RepositoryFixture('install-benchmark')
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes')
+    installer = AliasInstaller(repo.env)
+    bin_path = Path(repo.home, 'bin').absolute()
+
+    commands = ['git rev-parse --git-dir', 'git last 1', 'git hidden', 'git state --summary --timeout=0']
+    timings = {}
+
+    for mode in ('config', 'bin'):
+        if mode == 'config':
+            installer.install_config()
+        else:
+            installer.install_bin(bin_path)
+            repo.env['PATH'] = f'{bin_path}{os.pathsep}{repo.env["PATH"]}'
+
+        for cmd in commands:
+            seconds, _ = profile(repo, f'i=0; while [ $i -lt {runs} ]; do {cmd} > /dev/null; i=$((i + 1)); done')
+            timings[mode, cmd] = seconds / runs * 1000
+
+    config_size = Path(repo.env['GIT_CONFIG_GLOBAL']).stat().st_size
+    print(f'Global config: {config_size} bytes with the aliases installed as scripts\n')
+    print(f'{"Command":<36}{"Config":>10}{"Scripts":>10}{"Saved":>10}')
+    for cmd in commands:
+        config, scripts = timings['config', cmd], timings['bin', cmd]
+        print(f'{cmd:<36}{config:>8.2f}ms{scripts:>8.2f}ms{config - scripts:>8.2f}ms')
+
+    repo.teardown()
+
+
+def test():
+    """Test installing the aliases into the config and as scripts."""
+
+    # Every alias, run from a subdirectory for the ones that depend on it. The
+    # aliases alias lists config aliases, so it only works in the config modes.
+    commands = [
+        'git state',
+        '(cd subdir && git hide)',
+        'git hidden',
+        '(cd subdir && git unhide)',
+        'git stash push -q -m "Plucked stash" && git pluck 0',
+        'git last 1',
+        'git last',
+        'git feature',
+        'git uncommit',
+        'git refresh',
+    ]
+
+    def session(mode):
+        """Run the commands with the aliases installed one way, and return the results."""
+        repo = RepositoryFixture(f'install-{mode}-test')
+        repo.setup_snapshot('setup_initial_commit', 'setup_first_commit', 'setup_second_changes')
+        repo.run('mkdir subdir && touch subdir/.keep')
+        installer = AliasInstaller(repo.env)
+        bin_path = Path(repo.home, 'bin').absolute()
+
+        if mode == 'config':
+            installer.install_config()
+        else:
+            installer.install_bin(bin_path)
+            repo.env['PATH'] = f'{bin_path}{os.pathsep}{repo.env["PATH"]}'
+
+            # Installing the scripts leaves no aliases in the config, and every script is valid
+            result, = repo.run_batch(['git config --global --get-regexp "^alias[.]"'], check=False)
+            if result.stdout:
+                raise AssertionError(f'Aliases are left in the config:\n{result.stdout}')
+            for name in installer.names:
+                script = Path(bin_path, f'git-{name}')
+                if not os.access(script, os.X_OK):
+                    raise AssertionError(f'{script} is not executable.')
+                result, = repo.run_batch([f'sh -n "{script}"'], check=False)
+                if result.returncode != 0:
+                    raise AssertionError(f'{script} is not a valid script:\n{result.stderr}')
+
+        results = repo.run_batch(commands, check=False)
+        for result in results:
+            print(f'$ {result.args}\n{result.stdout}{result.stderr}')
+
+        if mode == 'bin':
+            installer.remove_bin(bin_path)
+            if list(bin_path.iterdir()):
+                raise AssertionError(f'Scripts are left in {bin_path}.')
+
+        repo.teardown()
+        return [(result.args, result.returncode, repo.clean(result.stdout), result.stderr) for result in results]
+
+    config = session('config')
+    scripts = session('bin')
+
+    # The aliases did their work, so the comparison is meaningful
+    outputs = {args: (returncode, stdout) for args, returncode, stdout, stderr in config}
+    Verify(outputs['(cd subdir && git hide)'][1]).contains('Hidden: file-1.txt')
+    Verify(outputs['git hidden'][1]).contains('Hidden: file-2.txt')
+    Verify(outputs['git feature'][1]).contains("Switched to a new branch 'feature-dev-4d1fc795'")
+    Verify(outputs['git uncommit'][1]).contains('Uncommitted:')
+    for args, (returncode, stdout) in outputs.items():
+        if returncode != (1 if args == 'git refresh' else 0): # No upstream to refresh from
+            raise AssertionError(f'"{args}" exited with {returncode}.')
+
+    # The scripts behave exactly like the aliases, arguments included
+    for expected, result in zip(config, scripts):
+        if expected != result:
+            raise AssertionError(f'"{expected[0]}" differs between the config aliases and the scripts.\n'
+                                 f'Config: {expected[1:]}\nScripts: {result[1:]}')
+
+    # Setup a fixture for the include file
+    repo = RepositoryFixture('install-test')
+    repo.setup_snapshot('setup_initial_commit', 'setup_first_changes')
+    installer = AliasInstaller(repo.env)
+
+    # Install into an included file, with the values read back unchanged
+    installer.install_include()
+    installer.install_include()
+    include, *values = repo.run_batch(['git config --global --get-all include.path'] + [f'git config --get alias.{name}' for name in installer.names])
+    if include.stdout != f'{installer.include_path()}\n':
+        raise AssertionError(f'The global config includes {include.stdout!r} instead of the aliases file once.')
+    for (module, name, value), result in zip(installer.aliases, values):
+        if result.stdout[:-1] != value:
+            raise AssertionError(f'The included alias.{name} differs from its module.')
+    output = repo.print('git last 1')
+    Verify(output).contains('Initial commit')
+
+    # Removing the file removes every alias
+    installer.remove_include()
+    result, = repo.run_batch(['git config --get-regexp "^(alias|include)[.]"'], check=False)
+    if result.stdout or installer.include_path().exists():
+        raise AssertionError(f'Removing the include left the file or the config behind:\n{result.stdout}')
+
+    repo.teardown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Install the aliases into a config file included from the global Git config, or as git-<name> scripts.')
+    parser.add_argument('--include', metavar='FILE', help=f'path of the generated config file (default: ~/{INCLUDE_FILE})')
+    parser.add_argument('--bin', metavar='DIRECTORY', help='write git-<name> scripts to this directory on PATH, instead of config aliases')
+    parser.add_argument('--config', action='store_true', help='set each alias in the global config, one at a time')
+    parser.add_argument('--uninstall', action='store_true', help='remove the installed aliases or scripts')
+    parser.add_argument('--benchmark', action='store_true', help='compare the git startup time of the config aliases and the scripts')
+    args = parser.parse_args()
+
+    installer = AliasInstaller()
+    if args.benchmark:
+        benchmark()
+    elif args.bin:
+        installer.remove_bin(args.bin) if args.uninstall else installer.install_bin(args.bin)
+    elif args.config:
+        installer.remove_config() if args.uninstall else installer.install_config()
+    else:
+        installer.remove_include(args.include) if args.uninstall else installer.install_include(args.include)
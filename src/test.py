@@ -1,50 +1,247 @@
 import os
+import io
+import sys
+import json
+import time
+import argparse
 import importlib
-import subprocess
+import traceback
+import hashlib
+import contextlib
 from pathlib import Path
+from graphlib import TopologicalSorter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent))
+from src.Lib import fixture
+from src.Lib.registry import registry
+from src.install import AliasInstaller, write_atomic
+
+TOOLS = ['workspace', 'install', 'src.Lib.state', 'src.Lib.index'] # Entry points that have a unit test
+RESULTS = Path(fixture.CACHE, 'test-results.json') # Keys of the modules whose unit test passed
+
+
+def initialize_worker():
+    """Give each worker process its own fixture root so teardowns don't collide."""
+    fixture.ROOT = Path(fixture.ROOT, f'worker-{os.getpid()}')
+
+def run_module_test(module_name):
+    """Run the unit test for a single alias module and capture its output,
+    along with the aliases it used."""
+    start = time.perf_counter()
+    output = io.StringIO()
+    error = None
+    registry().used.clear()
+
+    with contextlib.redirect_stdout(output):
+        try:
+            importlib.import_module(module_name).test()
+        except Exception:
+            error = traceback.format_exc()
+
+    return module_name, time.perf_counter() - start, output.getvalue(), error, sorted(registry().used)
+
+
+class ResultCache:
+    """Remembers the modules whose unit test passed, keyed by a hash of
+    everything the test ran: the module, the aliases it used or depends on,
+    the library modules, and the Git version. A module whose key is
+    unchanged doesn't need to run again."""
+
+    def __init__(self, path=RESULTS, force=False):
+        self.path = Path(path)
+        self.results = {}
+        self.force = force
+        self.sources = {}
+        self.common = hashlib.sha1()
+
+        if self.path.exists():
+            self.results = json.loads(self.path.read_text())
+
+        library = sorted(Path(__file__).parent.joinpath('Lib').glob('*.py'))
+        for file in library:
+            self.common.update(file.read_bytes())
+        self.common.update(fixture.git_version().encode())
+        self.common.update(' '.join(registry().modules).encode()) # Adding or removing an alias runs everything
+
+    def source(self, module):
+        if module.__name__ not in self.sources:
+            self.sources[module.__name__] = Path(module.__file__).read_bytes()
+        return self.sources[module.__name__]
+
+    def key(self, module, aliases):
+        """Hash the module with the sources of the aliases its test used."""
+        digest = self.common.copy()
+        digest.update(self.source(module))
+
+        for name in sorted(aliases):
+            if name in registry().modules:
+                digest.update(self.source(registry().modules[name]))
+
+        return digest.hexdigest()
+
+    def aliases(self, module, used):
+        """The aliases a module's test depends on: the ones it used, and for
+        an alias module, itself and its declared dependencies."""
+        declared = [module.name()] if hasattr(module, 'name') else []
+        return sorted(registry().closure(*declared, *used))
+
+    def passed(self, module):
+        """Return whether the module passed with the same key before."""
+        result = self.results.get(module.__name__)
+        if self.force or not result:
+            return False
+        return result['key'] == self.key(module, result['aliases'])
+
+    def record(self, module, used, passed):
+        if passed:
+            aliases = self.aliases(module, used)
+            self.results[module.__name__] = {'key': self.key(module, aliases), 'aliases': aliases}
+        else:
+            self.results.pop(module.__name__, None)
+
+    def save(self):
+        """Write the results to a temporary file and rename it into place."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, json.dumps(self.results, indent=2, sort_keys=True))
 
 
 class TestRunner:
-    """Removes and recreates the known aliases, and runs the unit tests."""
+    """Runs the unit tests, and can remove and recreate the known aliases."""
 
-    def __init__(self):
-        self.alias_names = []
+    def __init__(self, force=False):
+        self.cache = ResultCache(force=force)
         self.get_alias_modules()
-        self.remove_aliases()
+        self.get_tool_modules()
+        self.installer = AliasInstaller()
+        self.alias_names = self.installer.names
 
     def get_alias_modules(self):
-        """Load and store the alias modules from the Aliases directory."""
+        """Load the alias modules through the registry, which also builds the
+        graph of their dependencies."""
 
-        self.src_path = Path(os.path.join(Path(__file__).parent, 'Aliases'))
-        self.alias_modules = []
+        self.alias_modules = list(registry())
+        self.graph = registry().module_graph()
 
-        for file in sorted(self.src_path.glob('*.py'), key=lambda f: f.name):
-            module_name = f'Aliases.{file.stem}'
-            module = importlib.import_module(module_name)
-            self.alias_modules.append(module)
-            print(module_name)
+        for module in self.alias_modules:
+            print(module.__name__)
+
+    def get_tool_modules(self):
+        """Load the entry point modules whose unit tests run with the aliases."""
+        self.tool_modules = [importlib.import_module(name) for name in TOOLS]
+        self.graph.update({module.__name__: set() for module in self.tool_modules})
 
     def remove_aliases(self):
-        """Removes the known aliases from the global Git configuration."""
+        """Removes the known aliases from the global Git configuration, both
+        the generated include file and any alias set on its own."""
+        self.installer.remove_include()
 
-        for module in self.alias_modules:
-            alias_name = module.command().split('alias.')[1].split("'")[0].strip()
-            self.alias_names.append(alias_name)
+        for alias_name in self.installer.remove_config():
+            print(f"Removed alias: {alias_name}")
 
-            # If the alias exists (return code 0), remove it
-            result = subprocess.run(['git', 'config', '--global', '--get', f'alias.{alias_name}'], capture_output=True, text=True)
-            if result.returncode == 0:
-                subprocess.run(['git', 'config', '--global', '--unset', f'alias.{alias_name}'], check=True)
-                print(f"Removed alias: {alias_name}")
+    def install_aliases(self):
+        """Install the known aliases into the global Git configuration. The
+        tests use their own throwaway configs, so this is done once, as a
+        single generated file included from the global config."""
+        self.installer.install_include()
 
-    def run_tests(self):
-        """Execute unit tests for all the loaded alias modules."""
+    def run_tests(self, jobs=1):
+        """Execute unit tests for all the loaded alias and tool modules."""
 
-        for module in self.alias_modules:
-            module.test() # Make sure the unit test passes
+        if jobs > 1:
+            return self.run_tests_parallel(jobs)
+
+        for module_name in TopologicalSorter(self.graph).static_order():
+            module = sys.modules[module_name]
+            if self.cache.passed(module):
+                print(f'cached {module_name}')
+                continue
+
+            registry().used.clear()
+            try:
+                module.test() # Make sure the unit test passes
+            except Exception:
+                self.cache.record(module, [], passed=False)
+                self.cache.save()
+                raise
+            self.cache.record(module, registry().used, passed=True)
+
+        self.cache.save()
+        return True
+
+    def run_tests_parallel(self, jobs):
+        """Execute the unit tests in a process pool, reporting results as they
+        finish. A module is only tested once the aliases it depends on have
+        passed, and is skipped if one of them failed."""
+
+        start = time.perf_counter()
+        test_time = 0.0
+        failures = []
+        skipped = []
+        cached = 0
+        sorter = TopologicalSorter(self.graph)
+        sorter.prepare()
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initialize_worker) as pool:
+            futures = {}
+
+            while sorter.is_active():
+                for module_name in sorter.get_ready():
+                    failed = sorted(self.graph[module_name].intersection(failures + skipped))
+                    if not failed and self.cache.passed(sys.modules[module_name]):
+                        cached += 1
+                        print(f'cached {module_name}')
+                        sorter.done(module_name)
+                    elif failed:
+                        skipped.append(module_name)
+                        print(f'SKIP {module_name} (depends on {", ".join(failed)})')
+                        sorter.done(module_name)
+                    else:
+                        futures[pool.submit(run_module_test, module_name)] = module_name
+
+                if not futures:
+                    continue # Skipped modules may have made others ready
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del futures[future]
+                    module_name, duration, output, error, used = future.result()
+                    test_time += duration
+                    sorter.done(module_name)
+                    self.cache.record(sys.modules[module_name], used, passed=not error)
+
+                    if error:
+                        failures.append(module_name)
+                        print(f'FAIL {module_name} ({duration:.2f}s)\n{output}{error}')
+                    else:
+                        print(f'ok   {module_name} ({duration:.2f}s)')
+
+        self.cache.save()
+        wall_time = time.perf_counter() - start
+        skipped_summary = f', {len(skipped)} skipped' if skipped else ''
+        print(f'\n{len(self.graph) - len(failures) - len(skipped)} passed ({cached} cached), {len(failures)} failed{skipped_summary} with {jobs} jobs')
+        # The tests compete for the CPUs, so their summed time is no serial baseline, and no speedup is derived from it
+        print(f'Wall time: {wall_time:.2f}s (summed test time: {test_time:.2f}s)')
+
+        if os.path.isdir(fixture.ROOT) and not os.listdir(fixture.ROOT):
+            os.rmdir(fixture.ROOT)
+
+        return not failures and not skipped
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Install the aliases and run their unit tests.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of alias modules to test concurrently')
+    parser.add_argument('--force', action='store_true', help='run every unit test, even the ones that passed without changes since')
+    args = parser.parse_args()
+
     os.system('clear')
-    test_runner = TestRunner()
-    test_runner.run_tests()
+    test_runner = TestRunner(args.force)
+    test_runner.remove_aliases()
+    passed = test_runner.run_tests(args.jobs)
+
+    if not passed:
+        sys.exit(1)
+
+    test_runner.install_aliases()
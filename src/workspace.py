@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import shlex
+import argparse
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Local imports
+sys.path.append(str(Path(__file__).parent.parent))
+from src.Lib import fixture
+from src.Lib.fixture import RepositoryFixture
+from src.Lib.registry import registry
+
+
+def find_repositories(root):
+    """Find the Git repositories under a directory, without descending into them."""
+    repositories = []
+
+    for directory, subdirectories, files in os.walk(root):
+        if '.git' in subdirectories or '.git' in files:
+            repositories.append(Path(directory))
+            subdirectories.clear()
+        subdirectories.sort()
+
+    return repositories
+
+
+class WorkspaceRefresh:
+    """Runs the refresh alias in every repository under a directory with a
+    bounded pool of workers, and reports the outcome for each repository."""
+
+    def __init__(self, root, jobs=8, skip_dirty=False, env=None):
+        self.root = Path(root)
+        self.jobs = jobs
+        self.skip_dirty = skip_dirty
+        self.env = dict(env or os.environ, LC_ALL='C') # The failure messages are reported in English
+        self.results = []
+
+        # Run the alias body straight from its module, so an installed alias isn't needed
+        self.alias = shlex.split(registry().module('refresh').command())[-1]
+
+    def run(self):
+        """Refresh the repositories concurrently and return the results by repository."""
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [pool.submit(self.refresh, path) for path in find_repositories(self.root)]
+            self.results = [future.result() for future in as_completed(futures)]
+
+        self.results.sort(key=lambda result: result['repository'])
+        self.wall_time = time.perf_counter() - start
+        return self.results
+
+    def git(self, path, *args):
+        return subprocess.run(['git', *args], cwd=path, text=True, capture_output=True, env=self.env)
+
+    def snapshot(self, path):
+        """Return the branches with their commits, and the number of stashes."""
+        branches = self.git(path, 'for-each-ref', '--format=%(refname:short) %(objectname)', 'refs/heads/').stdout.split()
+        stashes = self.git(path, 'stash', 'list').stdout.count('\n')
+        return dict(zip(branches[::2], branches[1::2])), stashes
+
+    def refresh(self, path):
+        """Refresh a single repository and classify what happened, from the
+        branches and stashes before and after rather than from the messages,
+        which change with the Git version and the pull settings."""
+        start = time.perf_counter()
+        result = {'repository': str(path.relative_to(self.root)), 'pruned': 0}
+
+        if self.skip_dirty and self.git(path, 'status', '--porcelain', '--untracked-files=no').stdout:
+            result.update(outcome='skipped dirty', seconds=time.perf_counter() - start)
+            return result
+
+        branches, stashes = self.snapshot(path)
+        process = self.git(path, '-c', f'alias.refresh={self.alias}', 'refresh')
+        after, stashes_after = self.snapshot(path)
+        current = self.git(path, 'branch', '--show-current').stdout.strip()
+        result['pruned'] = len(set(branches) - set(after))
+
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines() or ['exit code %d' % process.returncode]
+            result['outcome'] = f'failed: {lines[-1]}'
+        elif stashes_after > stashes:
+            result['outcome'] = 'conflict on stash pop' # A stash that applies cleanly is dropped
+        elif branches.get(current) == after.get(current):
+            result['outcome'] = 'up to date'
+        elif self.git(path, 'merge-base', '--is-ancestor', branches.get(current, ''), after.get(current, '')).returncode == 0:
+            result['outcome'] = 'fast-forwarded'
+        else:
+            result['outcome'] = 'updated'
+
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    def print_table(self):
+        """Print one line per repository, and the wall time against the serial time."""
+        width = max([len('Repository')] + [len(result['repository']) for result in self.results])
+        print(f'{"Repository":<{width}}  {"Outcome":<24}{"Pruned":>7}{"Seconds":>9}')
+
+        for result in self.results:
+            print(f'{result["repository"]:<{width}}  {result["outcome"]:<24}{result["pruned"]:>7}{result["seconds"]:>9.2f}')
+
+        serial_time = sum(result['seconds'] for result in self.results)
+        print(f'\n{len(self.results)} repositories in {self.wall_time:.2f}s (serial: {serial_time:.2f}s) with {self.jobs} jobs')
+
+
+def test():
+    """Test the workspace refresh against clones of a local bare remote."""
+
+    # Setup a bare remote with one commit, and a workspace of clones
+    source = RepositoryFixture('workspace-source')
+    source.setup_snapshot('setup_initial_commit')
+    remote = Path(fixture.ROOT, 'workspace-remote.git').absolute()
+    workspace = Path(fixture.ROOT, 'workspace')
+    source.run(f'git clone -q --bare . "{remote}"')
+
+    for name in ['clean', 'dirty', 'nested/current']:
+        source.run(f'git clone -q "{remote}" "{Path(workspace, name).absolute()}"')
+
+    # Merge a feature branch of the clean clone on the remote
+    clean = Path(workspace, 'clean').absolute()
+    source.run_batch([
+        f'git -C "{clean}" checkout -q -b feature-dev-0dc6a7a1',
+        f'printf "Merged change.\\n" > "{clean}/file-1.txt"',
+        f'git -C "{clean}" commit -q -am "Merged change"',
+        f'git -C "{clean}" push -q origin feature-dev-0dc6a7a1:dev',
+    ])
+
+    # Leave a change in the dirty clone that conflicts with the merged one
+    Path(workspace, 'dirty', 'file-1.txt').write_text('Conflicting change.\n')
+
+    # Pulling with rebase prints other messages, which don't change the outcome
+    source.run(f'git -C "{Path(workspace, "nested/current").absolute()}" config pull.rebase true')
+
+    def outcomes(refresh):
+        results = refresh.run()
+        refresh.print_table()
+        return {result['repository']: (result['outcome'], result['pruned']) for result in results}
+
+    # Dirty repositories can be skipped
+    results = outcomes(WorkspaceRefresh(workspace, jobs=2, skip_dirty=True, env=source.env))
+    expected = {'clean': ('fast-forwarded', 1), 'dirty': ('skipped dirty', 0), 'nested/current': ('fast-forwarded', 0)}
+    if results != expected:
+        raise AssertionError(f'Refreshing the clean repositories gave {results}, expected {expected}.')
+
+    # Without skipping, the stashed change conflicts with the pulled one
+    results = outcomes(WorkspaceRefresh(workspace, jobs=2, env=source.env))
+    expected = {'clean': ('up to date', 0), 'dirty': ('conflict on stash pop', 0), 'nested/current': ('up to date', 0)}
+    if results != expected:
+        raise AssertionError(f'Refreshing every repository gave {results}, expected {expected}.')
+
+    source.teardown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run git refresh in every repository under a directory.')
+    parser.add_argument('root', nargs='?', default='.', help='directory to search for repositories')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='number of repositories to refresh concurrently')
+    parser.add_argument('--skip-dirty', action='store_true', help='leave repositories with uncommitted changes alone')
+    args = parser.parse_args()
+
+    refresh = WorkspaceRefresh(args.root, args.jobs, args.skip_dirty)
+    refresh.run()
+    refresh.print_table()